@@ -1,23 +1,124 @@
+import click
 from flask import Flask
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
-from models import SessionLocal
+import database
+import migrations
+import metrics
+import votes
+import cache
+import compression
+import live
+import serializers
+import results
+import ratelimit
+import snapshots
+import passwords
+from models import User
 from blueprints.auth import auth_bp
 from blueprints.admin import admin_bp
 from blueprints.videos import videos_bp
 from blueprints.theme_weeks import theme_weeks_bp
+from blueprints.search import search_bp
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    # За прокси request.remote_addr — адрес клиента, а не прокси (лимиты по IP, логи)
+    if app.config['TRUSTED_PROXY_HOPS']:
+        hops = app.config['TRUSTED_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
     # Разрешить CORS для всех методов и заголовков
     CORS(app)
+    serializers.init_app(app)
+    database.init_app(app)
+    metrics.init_app(app)
+    cache.init_app(app)
+    compression.init_app(app)
+    votes.init_app(app)
+    ratelimit.init_app(app)
+    live.init_app(app)
+    snapshots.init_app(app)
     
     # Регистрация blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(videos_bp, url_prefix='/api/videos')
     app.register_blueprint(theme_weeks_bp, url_prefix='/api/theme-weeks')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+    
+    migrations.init_app(app)
+    
+    @app.cli.command('rebuild-tallies')
+    def rebuild_tallies_command():
+        session = database.SessionLocal()
+        try:
+            count = votes.rebuild_tallies(session)
+            session.commit()
+            print(f'Rebuilt vote tallies for {count} videos')
+        finally:
+            session.close()
+    
+    @app.cli.command('hash-passwords')
+    def hash_passwords_command():
+        # Хэширует пароли, оставшиеся в открытом виде; без команды они переводятся при входе
+        session = database.SessionLocal()
+        try:
+            rows = [(user_id, password) for user_id, password in session.query(User.id, User.password_hash)
+                    if not passwords.is_hashed(password)]
+            for start in range(0, len(rows), 100):
+                chunk = rows[start:start + 100]
+                hashes = passwords.hash_many([password for _, password in chunk])
+                session.bulk_update_mappings(User, [
+                    {'id': user_id, 'password_hash': value} for (user_id, _), value in zip(chunk, hashes)
+                ])
+                session.commit()
+            print(f'Hashed {len(rows)} plaintext passwords')
+        finally:
+            session.close()
+    
+    @app.cli.command('snapshot-weeks')
+    @click.argument('week_id', required=False)
+    def snapshot_weeks_command(week_id):
+        # Пересобирает снимки подведённых недель (например, после смены SNAPSHOT_DIR или формата)
+        session = database.SessionLocal()
+        try:
+            week_ids = [week_id] if week_id else snapshots.archived_weeks(session)
+            written = [current_id for current_id in week_ids if snapshots.write_snapshot(session, current_id)]
+            print(f'Wrote {len(written)} theme week snapshots to {app.config["SNAPSHOT_DIR"]}')
+        finally:
+            session.close()
+    
+    @app.cli.command('finalize-weeks')
+    @click.argument('week_id', required=False)
+    @click.option('--winners', type=click.IntRange(min=0), default=None, help='Number of winning places.')
+    @click.option('--force', is_flag=True, help='Finalize even if the week has not ended.')
+    def finalize_weeks_command(week_id, winners, force):
+        # Без WEEK_ID подводит итоги всех закончившихся недель, каждой в своей транзакции
+        winners = winners if winners is not None else app.config['WEEK_WINNERS']
+        session = database.SessionLocal()
+        try:
+            week_ids = [week_id] if week_id else results.due_weeks(session)
+            for current_id in week_ids:
+                week = results.lock_week(session, current_id)
+                if week is None:
+                    print(f'Theme week {current_id} not found')
+                    continue
+                try:
+                    rows = results.finalize_week(session, week, winners, force=force)
+                    session.commit()
+                except results.FinalizationError as e:
+                    session.rollback()
+                    print(f'Skipped {current_id}: {e}')
+                    continue
+                with app.test_request_context():
+                    results.invalidate_results(current_id)
+                snapshots.write_snapshot(session, current_id)
+                print(f'Finalized {current_id}: {len(rows)} videos, '
+                      f'{sum(row["is_winner"] for row in rows)} winners')
+        finally:
+            session.close()
     
     return app
 
@@ -0,0 +1,447 @@
+# ASGI-вход для публичного API: чтения недель и видео и голосование на async-стеке.
+# Соединения берутся из пула async-движка SQLAlchemy, а сами выборки — те же функции, что
+# во Flask-вьюхах: они выполняются в AsyncSession.run_sync и не занимают воркер, пока ждут базу.
+# SSE-поток голосов тоже здесь: открытый поток — корутина, ждущая брокер, а не занятый воркер.
+# Вход и регистрация: хэш пароля считается в пуле passwords, а цикл событий тем временем свободен.
+# Остальные маршруты (auth, admin, ?stream=) обслуживает app:app — балансировщик
+# направляет сюда только пути из ROUTES.
+# Запуск: uvicorn asgi:app --workers 4 (нужны uvicorn и драйвер asyncpg или aiosqlite)
+import asyncio
+import logging
+import math
+import re
+from datetime import datetime
+from functools import wraps
+from json import loads
+from urllib.parse import parse_qsl
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from werkzeug.http import parse_etags
+from config import Config
+from database import engine_options
+from models import Video, Material
+from tokens import check_authorization
+from pagination import fetch_page, clamp_limit, InvalidCursor
+from serializers import (dumps, InvalidFields, theme_week_serializer, video_serializer, material_serializer,
+                         THEME_WEEK_LIST_FIELDS, VIDEO_LIST_FIELDS)
+from blueprints.theme_weeks import list_weeks, parse_moment, current_week, week_detail, leaderboard, vote_snapshot
+from blueprints.videos import video_list_query, vote_target
+from blueprints.auth import credentials_error, find_user, save_password_hash, create_user, login_payload
+# Кэш ответов, лимиты, кэш голосов и рассылка голосов настраиваются тем же create_app()
+from app import app as flask_app
+import cache
+import compression
+import live
+import passwords
+import ratelimit
+import votes
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite'
+}
+
+_engine = None
+_session_factory = None
+
+
+def async_url(url):
+    # postgresql://... -> postgresql+asyncpg://...; драйвер sync-URL отбрасывается
+    scheme, separator, rest = url.partition('://')
+    driver = ASYNC_DRIVERS.get(scheme.split('+')[0])
+    if driver is None:
+        raise ValueError(f'No async driver for {scheme}; set ASYNC_DATABASE_URL')
+    return driver + separator + rest
+
+
+def get_engine():
+    global _engine, _session_factory
+    if _engine is None:
+        url = Config.ASYNC_DATABASE_URL or async_url(Config.SQLALCHEMY_DATABASE_URI)
+        _engine = create_async_engine(url, **engine_options(url=url))
+        _session_factory = sessionmaker(_engine, class_=AsyncSession, expire_on_commit=False)
+    return _engine
+
+
+async def run(fn, *args):
+    # fn(session, *args) — обычный sync-код; соединение берётся только при первом запросе к базе
+    get_engine()
+    async with _session_factory() as session:
+        return await session.run_sync(fn, *args)
+
+
+class Request:
+    def __init__(self, scope, receive=None):
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.items = parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+        self.args = {}
+        for key, value in self.items:
+            self.args.setdefault(key, value)
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.remote_addr = ratelimit.forwarded_for(self.headers.get('x-forwarded-for'), Config.TRUSTED_PROXY_HOPS,
+                                                   (scope.get('client') or (None,))[0])
+        self.cache_ttl = None
+
+    def arg(self, name, type=None, default=None):
+        # Как request.args.get во Flask: неприводимое значение — default
+        value = self.args.get(name)
+        if value is None or type is None:
+            return default if value is None else value
+        try:
+            return type(value)
+        except ValueError:
+            return default
+
+    async def json(self):
+        # Тело запроса как JSON или None (как request.get_json(silent=True))
+        body = b''
+        while self.receive is not None:
+            message = await self.receive()
+            if message['type'] != 'http.request':
+                return None
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        try:
+            return loads(body) if body else None
+        except ValueError:
+            return None
+
+
+def json(data, status=200, headers=None):
+    return status, dumps(data), dict(headers or {}, **{'Content-Type': 'application/json'})
+
+
+def error(message, status):
+    return json({'error': message}, status)
+
+
+ROUTES = []
+
+
+def route(method, pattern):
+    regex = re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', pattern) + '$')
+
+    def register(handler):
+        ROUTES.append((method, regex, handler))
+        return handler
+    return register
+
+
+def cached(handler):
+    # Тот же кэш и те же ключи, что у cache.cached: с бэкендом 'file' записи общие с app:app
+    @wraps(handler)
+    async def decorated(request, **params):
+        query = cache.query_key(request.items)
+        entry = cache.lookup(request.path, query)
+        if entry is not None:
+            if parse_etags(request.headers.get('if-none-match')).contains_weak(entry['etag']):
+                return 304, b'', _entry_headers(request, entry, {'X-Cache': 'HIT'})[1]
+            body, headers = _entry_headers(request, entry, dict(entry['headers'], **{'X-Cache': 'HIT'}))
+            return 200, body, dict(headers, **{'Content-Type': entry['mimetype']})
+
+        status, body, headers = await handler(request, **params)
+        if status != 200 or (request.cache_ttl is not None and request.cache_ttl <= 0):
+            return status, body, headers
+        entry = cache.make_entry(body, 'application/json', headers)
+        cache.store(request.path, query, entry, request.cache_ttl)
+        body, headers = _entry_headers(request, entry, dict(headers, **{'X-Cache': 'MISS'}))
+        return status, body, headers
+    return decorated
+
+
+def _entry_headers(request, entry, headers):
+    # Тело и заголовки записи кэша: сжатый вариант, если клиент его принимает (как cache._serve)
+    if not entry['encoded']:
+        return entry['body'], dict(headers, ETag=f'"{entry["etag"]}"')
+    headers = dict(headers, Vary='Accept-Encoding', ETag=f'W/"{entry["etag"]}"')
+    encoding = compression.negotiate(request.headers.get('accept-encoding'))
+    if encoding not in entry['encoded']:
+        return entry['body'], headers
+    return entry['encoded'][encoding], dict(headers, **{'Content-Encoding': encoding})
+
+
+async def _page(request, build_query, model, dump):
+    if request.arg('stream'):
+        return error('Streaming is served by the WSGI app', 400)
+    limit = clamp_limit(request.arg('limit', int))
+    try:
+        rows, cursor = await run(fetch_page, build_query, model, request.arg('after'), limit)
+    except InvalidCursor:
+        return error('Invalid cursor', 400)
+    return json([dump(row) for row in rows], headers={'X-Next-Cursor': cursor} if cursor else None)
+
+
+def _limited(request, endpoint, user_id=None):
+    wait = ratelimit.check(endpoint, request.remote_addr, user_id)
+    if not wait:
+        return None
+    status, body, headers = error('Too many requests', 429)
+    return status, body, dict(headers, **{'Retry-After': str(math.ceil(wait))})
+
+
+def _user_id(request):
+    payload, message = check_authorization(request.headers.get('authorization'))
+    return (payload['user_id'], None) if payload else (None, error(message, 401))
+
+
+# Статичные пути раньше '<week_id>': маршруты проверяются по порядку
+
+@route('GET', '/api/theme-weeks/')
+@cached
+async def get_theme_weeks(request):
+    fields = theme_week_serializer.names(request.arg('fields'), THEME_WEEK_LIST_FIELDS)
+    return json(await run(list_weeks, fields))
+
+
+@route('GET', '/api/theme-weeks/current')
+@cached
+async def get_current_theme_week(request):
+    at = request.arg('at')
+    try:
+        moment = parse_moment(at) if at else datetime.utcnow()
+    except ValueError:
+        return error('Invalid at timestamp', 400)
+    fields = theme_week_serializer.names(request.arg('fields'))
+    week, request.cache_ttl = await run(current_week, fields, moment, not at)
+    return json(week)
+
+
+@route('GET', '/api/theme-weeks/materials')
+@cached
+async def get_all_materials(request):
+    fields = material_serializer.names(request.arg('fields'))
+    return await _page(request, lambda session: material_serializer.query(session, fields), Material,
+                       material_serializer.dumper(fields))
+
+
+@route('GET', '/api/theme-weeks/<week_id>')
+@cached
+async def get_theme_week(request, week_id):
+    week = await run(week_detail, week_id, theme_week_serializer.names(request.arg('fields')))
+    return json(week) if week else error('Not found', 404)
+
+
+@route('GET', '/api/theme-weeks/<week_id>/leaderboard')
+@cached
+async def get_leaderboard(request, week_id):
+    top = max(1, min(request.arg('top', int, 10), 100))
+    return json(await run(leaderboard, week_id, top))
+
+
+@route('GET', '/api/theme-weeks/<week_id>/votes/stream')
+async def stream_votes(request, week_id):
+    # Подписка раньше снимка: голос между ними может прийти дважды, но не потеряется
+    subscription = live.subscribe(week_id, asyncio.get_running_loop())
+    try:
+        snapshot = await run(vote_snapshot, week_id)
+    except BaseException:
+        subscription.close()
+        raise
+    if snapshot is None:
+        subscription.close()
+        return error('Not found', 404)
+    return 200, live.event_stream(subscription, snapshot), dict(live.STREAM_HEADERS)
+
+
+@route('GET', '/api/videos/')
+@cached
+async def get_videos(request):
+    fields = video_serializer.names(request.arg('fields'), VIDEO_LIST_FIELDS)
+    return await _page(request, video_list_query(fields, request.arg('theme_week_id')), Video,
+                       video_serializer.dumper(fields))
+
+
+@route('GET', '/api/videos/my-votes')
+async def my_votes(request):
+    user_id, failure = _user_id(request)
+    if failure:
+        return failure
+    theme_week_id = request.arg('theme_week_id')
+    voted = await run(votes.user_votes, user_id)
+    return json(sorted(video_id for video_id, week_id in voted.items()
+                       if not theme_week_id or week_id == theme_week_id))
+
+
+def _record_vote(session, user_id, video_id):
+    # Проверка видео, голос и агрегат — одним run_sync. VoteBuffer здесь не используется:
+    # ожидание его Future заблокировало бы цикл событий.
+    video = vote_target(session, video_id)
+    if video is None or video.finalized_at is not None:
+        return video, False
+    created = votes.record_vote(session, user_id, video_id, video.theme_week_id)
+    session.commit()
+    return video, created
+
+
+@route('POST', '/api/videos/<video_id>/vote')
+async def vote_video(request, video_id):
+    user_id, failure = _user_id(request)
+    if failure:
+        return failure
+    failure = _limited(request, 'videos.vote_video', user_id)
+    if failure:
+        return failure
+    if votes.has_voted(user_id, video_id):
+        return error('You have already voted for this video', 400)
+
+    video, created = await run(_record_vote, user_id, video_id)
+    if not video:
+        return error('Video not found', 404)
+    if video.finalized_at is not None:
+        return error('Voting for this theme week is closed', 403)
+    votes.remember_vote(user_id, video_id, video.theme_week_id)
+    if not created:
+        return error('You have already voted for this video', 400)
+
+    live.publish_vote(video.theme_week_id, video_id)
+    cache.invalidate_path('/api/videos/')
+    cache.invalidate_path(f'/api/theme-weeks/{video.theme_week_id}/leaderboard')
+    return json({'message': 'Vote recorded successfully'}, 201)
+
+
+@route('POST', '/api/auth/register')
+async def register(request):
+    failure = _limited(request, 'auth.register')
+    if failure:
+        return failure
+    data = await request.json()
+    message = credentials_error(data)
+    if message:
+        return error(message, 400)
+    if await run(find_user, data['username']):
+        return error('Username already exists', 400)
+
+    password_hash = await passwords.hash_password_async(data['password'])
+    if not await run(create_user, data['username'], password_hash, data.get('is_admin', False)):
+        return error('Username already exists', 400)
+    return json({'message': 'User created successfully'}, 201)
+
+
+@route('POST', '/api/auth/login')
+async def login(request):
+    failure = _limited(request, 'auth.login')
+    if failure:
+        return failure
+    data = await request.json()
+    message = credentials_error(data)
+    if message:
+        return error(message, 400)
+
+    user = await run(find_user, data['username'])
+    valid, new_hash = await passwords.verify_password_async(data['password'], user.password_hash if user else None)
+    if not valid:
+        return error('Invalid credentials', 401)
+    if new_hash:
+        await run(save_password_hash, user.id, new_hash)
+    return json(login_payload(user))
+
+
+async def dispatch(request):
+    allowed = []
+    for method, regex, handler in ROUTES:
+        match = regex.match(request.path)
+        if match is None:
+            continue
+        if method == request.method or (method == 'GET' and request.method == 'HEAD'):
+            return await handler(request, **match.groupdict())
+        allowed.append(method)
+
+    if allowed and request.method == 'OPTIONS':
+        # Preflight CORS, как у flask_cors в app:app
+        return 200, b'', {
+            'Allow': ', '.join(allowed + ['OPTIONS']),
+            'Access-Control-Allow-Methods': ', '.join(allowed + ['OPTIONS']),
+            'Access-Control-Allow-Headers': request.headers.get('access-control-request-headers', '')
+        }
+    if allowed:
+        return error('Method not allowed', 405)
+    return error('Not found', 404)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            get_engine()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _engine is not None:
+                await _engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _raw_headers(headers):
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_stream(request, receive, send, status, chunks, headers):
+    # Тело — асинхронный генератор (SSE): куски уходят по мере готовности, без Content-Length.
+    # Отключение клиента прерывает ожидание следующего куска, и генератор закрывает подписку.
+    if 'origin' in request.headers:
+        headers['Access-Control-Allow-Origin'] = '*'
+    await send({'type': 'http.response.start', 'status': status, 'headers': _raw_headers(headers)})
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    chunk = None
+    try:
+        while request.method != 'HEAD':
+            chunk = asyncio.ensure_future(chunks.__anext__())
+            await asyncio.wait({chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not chunk.done():
+                return
+            try:
+                data = chunk.result()
+            except StopAsyncIteration:
+                break
+            await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        if chunk is not None and not chunk.done():
+            # Отмена ожидания внутри генератора выполняет его finally (отписку)
+            chunk.cancel()
+            await asyncio.wait({chunk})
+        await chunks.aclose()
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    request = Request(scope, receive)
+    try:
+        status, body, headers = await dispatch(request)
+    except InvalidFields as e:
+        status, body, headers = error(str(e), 400)
+    except Exception:
+        logger.exception('Unhandled error in %s %s', request.method, request.path)
+        status, body, headers = error('Internal server error', 500)
+
+    if not isinstance(body, bytes):
+        return await _send_stream(request, receive, send, status, body, headers)
+
+    if 'Content-Encoding' not in headers and compression.compressible(headers.get('Content-Type'), len(body)):
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = compression.negotiate(request.headers.get('accept-encoding'))
+        data = compression.compress(body, encoding) if encoding else body
+        if len(data) < len(body):
+            body, headers['Content-Encoding'] = data, encoding
+    if 'origin' in request.headers:
+        headers['Access-Control-Allow-Origin'] = '*'
+    raw_headers = _raw_headers(headers)
+    raw_headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': b'' if request.method == 'HEAD' else body})
@@ -0,0 +1,94 @@
+# Сравнение sync-воркеров (gunicorn app:app) и ASGI-входа (uvicorn asgi:app) при высокой конкуренции:
+# оба сервера поднимаются подпроцессами на одной засеянной базе, нагрузка — из benchmarks.load.
+# Кэш ответов выключен, чтобы мерить работу с базой. Нужны gunicorn, uvicorn и async-драйвер.
+# Показательны замеры на Postgres (--database-url): SQLite сериализует запись между процессами,
+# и при голосовании под нагрузкой часть запросов получает 'database is locked'.
+# Запуск: python -m benchmarks.asgi [--workers 2] [--threads 4] [--concurrency 64] [--duration 15]
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from config import Config
+from benchmarks import seed as seeding
+from benchmarks.load import build_operations, issue_tokens, run_load, print_report
+
+MIX = {
+    'GET /api/videos': 45,
+    'GET /api/theme-weeks/<id>': 35,
+    'POST /api/videos/<id>/vote': 20
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start(command, port, env, log):
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=log)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{command[2]} exited, see {log.name}')
+        try:
+            urllib.request.urlopen(url + '/api/theme-weeks/', timeout=1).read()
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{command[2]} did not start, see {log.name}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='потоков на sync-воркер gunicorn')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15.0)
+    seeding.add_arguments(parser)
+    args = parser.parse_args()
+
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'asgi.db')
+    from database import get_engine
+    counts = {name: getattr(args, name) for name in seeding.DEFAULTS}
+    data = seeding.seed(get_engine(), **counts)
+    operations = build_operations(data, issue_tokens(data, count=len(data['users'])))
+
+    env = dict(os.environ, DATABASE_URL=Config.SQLALCHEMY_DATABASE_URI, RATE_LIMIT_BACKEND='none',
+               RESPONSE_CACHE_BACKEND='none', METRICS_ENABLED='false')
+    servers = {
+        'sync (gunicorn)': lambda port: [sys.executable, '-m', 'gunicorn', '-w', str(args.workers),
+                                         '--threads', str(args.threads), '-b', f'127.0.0.1:{port}', 'app:app'],
+        'async (uvicorn)': lambda port: [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers),
+                                         '--log-level', 'warning', '--port', str(port), 'asgi:app']
+    }
+
+    results = {}
+    log_dir = tempfile.mkdtemp()
+    for name, command in servers.items():
+        port = free_port()
+        log = open(os.path.join(log_dir, name.split()[0] + '.log'), 'w')
+        process, url = start(command(port), port, env, log)
+        try:
+            results[name] = run_load(url, operations, MIX, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+            log.close()
+        print(f'\n{name}, workers={args.workers}, concurrency={args.concurrency} (log: {log.name})')
+        print_report(results[name])
+
+    print(json.dumps({name: result['total'] for name, result in results.items()}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Сжатие больших списков: размер тела и CPU на ответ для gzip/brotli, а также время запроса
+# без сжатия, со сжатием на каждый запрос (кэш выключен) и с готовыми вариантами из кэша.
+# Запуск: python -m benchmarks.compression [--materials N] [--videos N] [--number N]
+import argparse
+import os
+import tempfile
+import time
+from config import Config
+
+
+def cpu_per_call(fn, number):
+    started = time.process_time()
+    for _ in range(number):
+        fn()
+    return (time.process_time() - started) / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--materials', type=int, default=2000)
+    parser.add_argument('--videos', type=int, default=2000)
+    parser.add_argument('--number', type=int, default=50, help='повторов на замер')
+    args = parser.parse_args()
+
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'compression.db')
+    Config.RATE_LIMIT_BACKEND = 'none'
+    Config.METRICS_ENABLED = False
+
+    from app import create_app
+    from database import get_engine
+    from benchmarks.seed import seed
+    from types import SimpleNamespace
+    from tokens import issue_token
+    import cache
+    import compression
+
+    data = seed(get_engine(), users=10, weeks=10, videos=args.videos, materials=args.materials, votes=0)
+    admin_user = SimpleNamespace(id=data['users'][0], username=data['usernames'][0], is_admin=True)
+    admin = {'Authorization': 'Bearer ' + issue_token(admin_user)}
+    paths = {
+        '/api/theme-weeks/materials': {},
+        '/api/videos/': {},
+        '/api/admin/materials': admin
+    }
+
+    app = create_app()
+    client = app.test_client()
+    print(f"{'path':<28} {'encoding':>8} {'bytes':>9} {'saved':>7} {'cpu ms':>8}")
+    for path, headers in paths.items():
+        body = client.get(path, headers=headers).get_data()
+        print(f'{path:<28} {"identity":>8} {len(body):>9} {"":>7} {"":>8}')
+        for encoding in compression.encodings():
+            data_size = len(compression.compress(body, encoding))
+            cpu = cpu_per_call(lambda: compression.compress(body, encoding), args.number)
+            print(f'{"":<28} {encoding:>8} {data_size:>9} {1 - data_size / len(body):>7.1%} {cpu * 1000:>8.2f}')
+
+    # Время запроса целиком: тело из кэша, сжатие всё равно выполняется per-request или берётся готовым
+    encoding = compression.encodings()[0]
+    print(f"\n{'path':<28} {'mode':>22} {'ms/request':>11}")
+    modes = (
+        ('identity, cache', {}, 'memory'),
+        (f'{encoding}, no cache', {'Accept-Encoding': encoding}, 'none'),
+        (f'{encoding}, precompressed', {'Accept-Encoding': encoding}, 'memory')
+    )
+    for path in ('/api/theme-weeks/materials', '/api/videos/'):
+        for label, headers, backend in modes:
+            app.config['RESPONSE_CACHE_BACKEND'] = backend
+            cache.init_app(app)
+            client.get(path, headers=headers)
+            cpu = cpu_per_call(lambda: client.get(path, headers=headers).get_data(), args.number)
+            print(f'{path:<28} {label:>22} {cpu * 1000:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
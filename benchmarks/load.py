@@ -0,0 +1,233 @@
+# Нагрузочный бенчмарк по эндпоинтам: засевает базу, поднимает create_app() (или бьёт в --url)
+# и гоняет смесь запросов из нескольких потоков. Результат печатается и сохраняется в JSON.
+# Запуск: python -m benchmarks.load --concurrency 16 --duration 30 [--label baseline]
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+from config import Config
+from benchmarks import seed as seeding
+
+# Вне дерева репозитория, чтобы прогоны не попадали в коммиты
+RESULTS_DIR = os.path.join(tempfile.gettempdir(), 'restart-benchmarks')
+
+DEFAULT_MIX = {
+    'GET /api/videos': 40,
+    'GET /api/theme-weeks/<id>': 30,
+    'POST /api/videos/<id>/vote': 20,
+    'POST /api/auth/login': 10
+}
+
+
+def build_operations(data, tokens):
+    # Каждая операция: (метка маршрута, функция -> (method, path, headers, body))
+    def videos():
+        return 'GET', '/api/videos/', {}, None
+
+    def theme_week():
+        return 'GET', f"/api/theme-weeks/{random.choice(data['weeks'])}", {}, None
+
+    def vote():
+        token = random.choice(tokens)
+        return 'POST', f"/api/videos/{random.choice(data['videos'])}/vote", {'Authorization': f'Bearer {token}'}, None
+
+    def login():
+        body = {'username': random.choice(data['usernames']), 'password': data['password']}
+        return 'POST', '/api/auth/login', {'Content-Type': 'application/json'}, json.dumps(body)
+
+    return {
+        'GET /api/videos': videos,
+        'GET /api/theme-weeks/<id>': theme_week,
+        'POST /api/videos/<id>/vote': vote,
+        'POST /api/auth/login': login
+    }
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status in samples if status == 'error' or status >= 500),
+        'statuses': statuses,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None
+    }
+
+
+def run_load(base_url, operations, mix, concurrency=16, duration=10.0, requests=None):
+    target = urlsplit(base_url)
+    labels = [label for label in mix if mix[label] > 0]
+    weights = [mix[label] for label in labels]
+    samples = {label: [] for label in labels}
+    lock = threading.Lock()
+    remaining = [requests]
+    deadline = time.monotonic() + duration
+
+    def take():
+        with lock:
+            if remaining[0] is None:
+                return time.monotonic() < deadline
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker():
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        local = {label: [] for label in labels}
+        while take():
+            label = random.choices(labels, weights)[0]
+            method, path, headers, body = operations[label]()
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+                status = 'error'
+            local[label].append((time.perf_counter() - started, status))
+        connection.close()
+        with lock:
+            for label, values in local.items():
+                samples[label].extend(values)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    routes = {label: summarize(values, elapsed) for label, values in samples.items()}
+    total = summarize([sample for values in samples.values() for sample in values], elapsed)
+    return {'elapsed_seconds': round(elapsed, 3), 'routes': routes, 'total': total}
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def print_report(result, previous=None):
+    header = f"{'route':<28} {'req':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    rows = list(result['routes'].items()) + [('TOTAL', result['total'])]
+    for label, stats in rows:
+        print(f"{label:<28} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>9} "
+              f"{stats['p50_ms']!s:>9} {stats['p95_ms']!s:>9} {stats['p99_ms']!s:>9}")
+        if previous:
+            before = previous['routes'].get(label) if label != 'TOTAL' else previous['total']
+            if before and before['throughput_rps'] and stats['p95_ms'] and before['p95_ms']:
+                print(f"{'  vs previous':<28} {'':>7} {'':>5} "
+                      f"{stats['throughput_rps'] / before['throughput_rps'] - 1:>+9.1%} {'':>9} "
+                      f"{stats['p95_ms'] / before['p95_ms'] - 1:>+9.1%}")
+
+
+def save(result, label, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{label}.json"
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    return path
+
+
+def issue_tokens(data, count=200):
+    import tokens
+    return [
+        tokens.issue_token(SimpleNamespace(id=user_id, username=username, is_admin=False))
+        for user_id, username in list(zip(data['users'], data['usernames']))[:count]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    parser.add_argument('--url', default=None, help='адрес уже запущенного сервера (иначе поднимается create_app())')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--requests', type=int, default=None, help='фиксированное число запросов вместо --duration')
+    parser.add_argument('--mix', default=None, help='веса маршрутов в JSON, например {"GET /api/videos": 1}')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--compare', default=None, help='JSON предыдущего прогона для сравнения')
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='куда сохранять JSON прогона')
+    parser.add_argument('--no-save', action='store_true')
+    seeding.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.url and not args.database_url:
+        parser.error('--url requires --database-url of the database that server uses')
+
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+    # Вся нагрузка идёт с одного адреса: лимиты частоты исказили бы замер
+    Config.RATE_LIMIT_BACKEND = 'none'
+
+    from database import get_engine
+    counts = {name: getattr(args, name) for name in seeding.DEFAULTS}
+    data = seeding.seed(get_engine(), **counts)
+    operations = build_operations(data, issue_tokens(data))
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        from app import create_app
+        server, base_url = serve(create_app())
+
+    try:
+        result = run_load(base_url, operations, mix, args.concurrency, args.duration, args.requests)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    result.update({
+        'label': args.label,
+        'timestamp': datetime.utcnow().isoformat(),
+        'target': args.url or 'create_app() in-process',
+        'database': get_engine().dialect.name,
+        'concurrency': args.concurrency,
+        'seed': counts,
+        'mix': mix
+    })
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(result, previous)
+    if not args.no_save:
+        print(f'Saved {save(result, args.label, args.results_dir)}')
+
+
+if __name__ == '__main__':
+    main()
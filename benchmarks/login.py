@@ -0,0 +1,70 @@
+# Пропускная способность POST /api/auth/login при разной стоимости хэширования паролей.
+# Логины идут из нескольких потоков через test client; печатает запросы/с и мс на вход.
+# Запуск: python -m benchmarks.login [--threads N] [--requests N] [--scrypt-n 16384 32768 ...]
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from config import Config
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='число входов на замер')
+    parser.add_argument('--scrypt-n', type=int, nargs='+', default=[Config.PASSWORD_SCRYPT_N])
+    parser.add_argument('--workers', type=int, default=Config.PASSWORD_HASH_WORKERS,
+                        help='размер пула хэширования (0 — по числу CPU)')
+    args = parser.parse_args()
+
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'login.db')
+    Config.RATE_LIMIT_BACKEND = 'none'
+    Config.METRICS_ENABLED = False
+    Config.PASSWORD_HASH_ALGORITHM = 'scrypt'
+    Config.PASSWORD_HASH_WORKERS = args.workers
+
+    from app import create_app
+    from database import get_engine
+    from benchmarks.seed import seed
+
+    body = json.dumps({'username': 'user1', 'password': 'password'})
+    print(f'threads={args.threads} pool={args.workers or os.cpu_count()} cpus={os.cpu_count()}')
+    for n in args.scrypt_n:
+        Config.PASSWORD_SCRYPT_N = n
+        if os.path.exists(Config.SQLALCHEMY_DATABASE_URI[len('sqlite:///'):]):
+            os.remove(Config.SQLALCHEMY_DATABASE_URI[len('sqlite:///'):])
+            get_engine().dispose()
+        seed(get_engine(), users=10, weeks=1, videos=0, materials=0, votes=0)
+        client = create_app().test_client()
+        client.post('/api/auth/login', data=body, content_type='application/json')
+
+        remaining = [args.requests]
+        lock = threading.Lock()
+        failures = []
+
+        def worker():
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                response = client.post('/api/auth/login', data=body, content_type='application/json')
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        print(f'scrypt n={n:>6}: {args.requests / elapsed:8.1f} logins/s, '
+              f'{elapsed / args.requests * 1000 * args.threads:7.1f} ms avg latency'
+              + (f', {len(failures)} failed' if failures else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# Регрессионная проверка планов запросов: прогоняет каждый эндпоинт на засеянной базе,
+# делает EXPLAIN для всех его SQL-запросов и завершается с кодом 1, если запрос к большой
+# таблице читает её последовательным сканированием.
+# Запуск: python -m benchmarks.query_plans [--database-url URL]
+import argparse
+import os
+import re
+import sys
+import tempfile
+from types import SimpleNamespace
+from sqlalchemy import event
+from config import Config
+
+LARGE_TABLES = {'users', 'videos', 'votes', 'materials', 'vote_tallies', 'week_results'}
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def endpoints(data, admin_headers, user_headers, dialect):
+    week = data['weeks'][0]
+    video = data['videos'][0]
+    checks = [
+        ('GET', '/api/theme-weeks/', None, None),
+        ('GET', f'/api/theme-weeks/{week}', None, None),
+        ('GET', '/api/theme-weeks/current', None, None),
+        ('GET', '/api/theme-weeks/current?at=2026-01-20T12:00:00', None, None),
+        ('GET', f'/api/theme-weeks/{week}/leaderboard?top=10', None, None),
+        ('GET', '/api/theme-weeks/materials?limit=50', None, None),
+        ('GET', '/api/videos/?limit=50', None, None),
+        ('GET', f'/api/videos/?theme_week_id={week}&limit=50', None, None),
+        ('POST', f'/api/videos/{video}/vote', user_headers, None),
+        ('GET', f'/api/videos/my-votes?theme_week_id={week}', user_headers, None),
+        ('POST', '/api/auth/login', None, {'username': data['usernames'][1], 'password': data['password']}),
+        ('GET', '/api/admin/users?limit=50', admin_headers, None),
+        ('GET', '/api/admin/videos?limit=50', admin_headers, None),
+        ('GET', '/api/admin/materials?limit=50', admin_headers, None),
+        ('PATCH', '/api/admin/materials/batch', admin_headers,
+         [{'id': material_id, 'changes': {'is_winner': True}} for material_id in data['materials'][:5]]),
+        ('PATCH', '/api/admin/videos/batch', admin_headers,
+         {'filter': {'id': data['videos'][1:6]}, 'changes': {'theme_week_id': data['weeks'][1]}}),
+        ('PATCH', '/api/admin/materials/batch', admin_headers,
+         {'filter': {'theme_week_id': week}, 'changes': {'description': 'Updated'}}),
+    ]
+    # В SQLite поиск читает таблицы целиком один раз, чтобы построить индекс в памяти
+    if dialect == 'postgresql':
+        checks += [
+            ('GET', '/api/search/?q=video%201', None, None),
+            ('GET', f'/api/search/?q=material&theme_week_id={week}', None, None),
+        ]
+    return checks
+
+
+def sequential_scans(connection, dialect, statement, parameters):
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+        plan = [row[-1] for row in rows]
+        scans = []
+        for line in plan:
+            match = SQLITE_SCAN.match(line)
+            if match and match.group(1) in LARGE_TABLES and 'USING' not in match.group(2):
+                scans.append(match.group(1))
+        return scans, plan
+
+    # Запрещаем seq scan: если он всё равно в плане, подходящего индекса нет
+    connection.exec_driver_sql('SET enable_seqscan = off')
+    plan = [row[0] for row in connection.exec_driver_sql(f'EXPLAIN {statement}', parameters)]
+    connection.exec_driver_sql('RESET enable_seqscan')
+    scans = [table for line in plan for table in POSTGRES_SCAN.findall(line) if table in LARGE_TABLES]
+    return scans, plan
+
+
+def auth_headers(data, index, is_admin):
+    import tokens
+    user = SimpleNamespace(id=data['users'][index], username=data['usernames'][index], is_admin=is_admin)
+    return {'Authorization': f'Bearer {tokens.issue_token(user)}'}
+
+
+def explain_endpoint(client, engine, method, path, headers, body):
+    # Выполняет запрос и возвращает ответ, число его SQL-запросов и план каждого из них
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = client.open(path, method=method, headers=headers, json=body)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    plans = []
+    if response.status_code < 500:
+        with engine.connect() as connection:
+            for statement, parameters in captured:
+                scans, plan = sequential_scans(connection, engine.dialect.name, statement, parameters)
+                plans.append((statement, scans, plan))
+    return response, len(captured), plans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+    Config.RESPONSE_CACHE_BACKEND = 'none'
+    Config.VOTE_BUFFER_ENABLED = False
+    Config.RATE_LIMIT_BACKEND = 'none'
+
+    from app import create_app
+    from database import get_engine
+    from benchmarks.seed import seed
+
+    engine = get_engine()
+    data = seed(engine, users=2000, weeks=20, videos=2000, materials=2000, votes=20000)
+    client = create_app().test_client()
+
+    failures = 0
+    checks = endpoints(data, auth_headers(data, 0, True), auth_headers(data, 1, False), engine.dialect.name)
+    for method, path, request_headers, body in checks:
+        response, queries, plans = explain_endpoint(client, engine, method, path, request_headers, body)
+        if response.status_code >= 500:
+            print(f'ERROR {method} {path}: HTTP {response.status_code}')
+            failures += 1
+            continue
+
+        endpoint_failures = 0
+        for statement, scans, plan in plans:
+            if scans:
+                endpoint_failures += 1
+                print(f'FAIL  {method} {path}: sequential scan on {", ".join(sorted(set(scans)))}')
+                print('      ' + ' '.join(statement.split()))
+                for line in plan:
+                    print(f'        {line}')
+            elif args.verbose:
+                print(f'ok    {method} {path}: {" ".join(statement.split())[:100]}')
+        failures += endpoint_failures
+        print(f'{"FAIL" if endpoint_failures else "ok":<5} {method} {path} ({queries} queries)')
+
+    if failures:
+        print(f'{failures} query plan regression(s)')
+        sys.exit(1)
+    print('All query plans use indexes')
+
+
+if __name__ == '__main__':
+    main()
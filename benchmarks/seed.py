@@ -0,0 +1,138 @@
+# Заполнение локальной базы синтетическими данными для бенчмарков и проверки планов запросов.
+# Запуск: python -m benchmarks.seed --database-url sqlite:///bench.db --users 1000 ...
+import argparse
+import random
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import create_engine, text
+from models import User, ThemeWeek, Video, Vote, VoteTally, Material
+import migrations
+from passwords import hash_password
+
+BATCH_SIZE = 5000
+
+DEFAULTS = {
+    'users': 1000,
+    'weeks': 10,
+    'videos': 500,
+    'materials': 500,
+    'votes': 20000
+}
+
+
+def _insert(connection, model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(model.__table__.insert(), rows[start:start + BATCH_SIZE])
+
+
+def seed(engine, users=DEFAULTS['users'], weeks=DEFAULTS['weeks'], videos=DEFAULTS['videos'],
+         materials=DEFAULTS['materials'], votes=DEFAULTS['votes'], password='password', seed_value=42):
+    rng = random.Random(seed_value)
+    migrations.upgrade(engine, echo=lambda message: None)
+    started = datetime(2026, 1, 5)
+
+    def moment(index):
+        return started + timedelta(seconds=index, microseconds=rng.randrange(1, 1000000))
+
+    # Один хэш на всех: у сида общий пароль, а считать тысячи scrypt незачем
+    password_hash = hash_password(password)
+    user_rows = [{
+        'id': str(uuid4()),
+        'username': f'user{i}',
+        'password_hash': password_hash,
+        'is_admin': i == 0,
+        'created_at': moment(i)
+    } for i in range(users)]
+
+    week_rows = [{
+        'id': str(uuid4()),
+        'title': f'Week {i}',
+        'description': f'Theme of week {i}',
+        'result_url': f'https://example.com/results/{i}',
+        'image_url': f'https://example.com/weeks/{i}.png',
+        'start_date': started + timedelta(weeks=i),
+        'end_date': started + timedelta(weeks=i + 1),
+        'created_at': moment(i)
+    } for i in range(weeks)]
+
+    video_rows = [{
+        'id': str(uuid4()),
+        'title': f'Video {i}',
+        'youtube_url': f'https://youtube.com/watch?v={i:011d}',
+        'description': f'Description of video {i} ' * 4,
+        'student_name': f'Student {i % max(users, 1)}',
+        'theme_week_id': week_rows[i % weeks]['id'],
+        'created_at': moment(i)
+    } for i in range(videos)]
+
+    material_rows = [{
+        'id': str(uuid4()),
+        'title': f'Material {i}',
+        'description': f'Description of material {i} ' * 4,
+        'student_name': f'Student {i % max(users, 1)}',
+        'material_type': rng.choice(('youtube', 'image', 'pdf', 'video')),
+        'url': f'https://res.cloudinary.com/demo/{i}',
+        'is_winner': i % 50 == 0,
+        'theme_week_id': week_rows[i % weeks]['id'],
+        'created_at': moment(i)
+    } for i in range(materials)]
+
+    pairs = set()
+    votes = min(votes, users * videos)
+    while len(pairs) < votes:
+        pairs.add((rng.randrange(users), rng.randrange(videos)))
+    vote_rows = [{
+        'id': str(uuid4()),
+        'user_id': user_rows[user]['id'],
+        'video_id': video_rows[video]['id'],
+        'created_at': moment(index)
+    } for index, (user, video) in enumerate(sorted(pairs))]
+
+    counts = {}
+    for _, video in pairs:
+        counts[video] = counts.get(video, 0) + 1
+    tally_rows = [{
+        'video_id': video_rows[video]['id'],
+        'theme_week_id': video_rows[video]['theme_week_id'],
+        'votes_count': count
+    } for video, count in counts.items()]
+
+    with engine.begin() as connection:
+        _insert(connection, User, user_rows)
+        _insert(connection, ThemeWeek, week_rows)
+        _insert(connection, Video, video_rows)
+        _insert(connection, Material, material_rows)
+        _insert(connection, Vote, vote_rows)
+        _insert(connection, VoteTally, tally_rows)
+
+    with engine.begin() as connection:
+        connection.execute(text('ANALYZE'))
+
+    return {
+        'users': [row['id'] for row in user_rows],
+        'usernames': [row['username'] for row in user_rows],
+        'weeks': [row['id'] for row in week_rows],
+        'videos': [row['id'] for row in video_rows],
+        'materials': [row['id'] for row in material_rows],
+        'password': password
+    }
+
+
+def add_arguments(parser):
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', required=True)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    seed(engine, **{name: getattr(args, name) for name in DEFAULTS})
+    print('Seeded', ', '.join(f'{getattr(args, name)} {name}' for name in DEFAULTS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# Стоимость сериализации больших списков: ORM-сущности + jsonify против выборки колонок
+# через serializers (полный и разреженный набор полей). Печатает время и байты на строку.
+# Запуск: python -m benchmarks.serialization [--rows N] [--repeat N]
+import argparse
+import os
+import tempfile
+import timeit
+from config import Config
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000, help='число видео в списке')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'serialization.db')
+
+    from flask import Flask, json
+    from database import get_engine, SessionLocal
+    from models import Video
+    from benchmarks.seed import seed
+    from serializers import base, dumps, video_serializer, VIDEO_LIST_FIELDS
+
+    seed(get_engine(), users=10, weeks=10, videos=args.rows, materials=0, votes=0)
+    app = Flask(__name__)
+    session = SessionLocal()
+
+    def legacy_dump(video):
+        return {
+            'id': video.id,
+            'title': video.title,
+            'youtube_url': video.youtube_url,
+            'description': video.description,
+            'student_name': video.student_name,
+            'theme_week_id': video.theme_week_id,
+            'created_at': video.created_at.isoformat()
+        }
+
+    def legacy_rows():
+        session.expunge_all()
+        return session.query(Video).all()
+
+    def legacy_encode(rows):
+        # То же, что делал jsonify: stdlib json, sort_keys, ensure_ascii
+        with app.app_context():
+            return json.dumps([legacy_dump(row) for row in rows]).encode()
+
+    def serializer_case(fields):
+        dump = video_serializer.dumper(fields)
+        return (lambda: video_serializer.query(session, fields).all(),
+                lambda rows: dumps([dump(row) for row in rows]))
+
+    cases = [
+        ('ORM + jsonify', legacy_rows, legacy_encode),
+        ('serializer, default fields', *serializer_case(video_serializer.default)),
+        ('serializer, list + votes', *serializer_case(VIDEO_LIST_FIELDS)),
+        ('serializer, fields=id,title', *serializer_case(('id', 'title'))),
+    ]
+
+    print(f"encoder: {'orjson' if base.orjson is not None else 'json (stdlib)'}, rows: {args.rows}")
+    print(f"{'case':<30} {'load ms':>9} {'encode ms':>10} {'total ms':>9} {'bytes/row':>10}")
+    for name, load, encode in cases:
+        rows = load()
+        body = encode(rows)
+        load_seconds = min(timeit.repeat(load, number=1, repeat=args.repeat))
+        encode_seconds = min(timeit.repeat(lambda: encode(rows), number=1, repeat=args.repeat))
+        print(f'{name:<30} {load_seconds * 1000:>9.1f} {encode_seconds * 1000:>10.1f} '
+              f'{(load_seconds + encode_seconds) * 1000:>9.1f} {len(body) / len(rows):>10.1f}')
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
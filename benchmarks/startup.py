@@ -0,0 +1,51 @@
+# Время от импорта приложения до первого ответа, в отдельном процессе на каждый замер.
+# Запуск: python -m benchmarks.startup [--runs N] [--database-url URL]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get('/api/theme-weeks/')
+finished = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'first_request': finished - imported, 'total': finished - started}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+    else:
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+    subprocess.run([sys.executable, 'migrations.py', 'upgrade'], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    for key in ('import', 'first_request', 'total'):
+        values = [sample[key] * 1000 for sample in samples]
+        print(f'{key:>14}: median {statistics.median(values):7.1f} ms, max {max(values):7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+# Сравнение стоимости проверки JWT с кэшем и без.
+# Запуск: python -m benchmarks.token_decode [--tokens N] [--number N]
+import argparse
+import timeit
+from types import SimpleNamespace
+import tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=100, help='число разных клиентов (токенов)')
+    parser.add_argument('--number', type=int, default=20000, help='число проверок на замер')
+    args = parser.parse_args()
+
+    issued = [
+        tokens.issue_token(SimpleNamespace(id=str(i), username=f'user{i}', is_admin=False))
+        for i in range(args.tokens)
+    ]
+
+    def run(use_cache):
+        for i in range(args.number):
+            tokens.decode_token(issued[i % len(issued)], use_cache=use_cache)
+
+    tokens._cache.clear()
+    for name, use_cache in (('no cache', False), ('cache', True)):
+        seconds = min(timeit.repeat(lambda: run(use_cache), number=1, repeat=3))
+        print(f'{name:>10}: {seconds / args.number * 1e6:8.2f} us/decode')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,64 +1,109 @@
-from flask import Blueprint, request, jsonify, abort
-from models import SessionLocal, ThemeWeek, User, Video, Material
-import jwt
-from config import Config
-from functools import wraps
+import logging
+from flask import Blueprint, request, jsonify, abort, current_app
+from tokens import admin_required
+from models import ThemeWeek, User, Video, Material
+from database import get_session, pool_status
 from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
+from votes import move_tally, delete_tally, forget_votes
+from results import lock_week, finalize_week, delete_results, invalidate_results, FinalizationError
+from pagination import list_response, stream_response
+from bulk import import_rows, update_rows, RowError
+from cache import invalidate
+from passwords import hash_password
+from serializers import (json_response, user_serializer, user_export_serializer, theme_week_serializer,
+                         video_serializer, material_serializer)
+import search
+import snapshots
 
 admin_bp = Blueprint('admin', __name__)
+logger = logging.getLogger(__name__)
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Токен отсутствует'}), 401
-            
+def _invalidate_week(week_id):
+    invalidate('theme_weeks.get_theme_weeks')
+    invalidate('theme_weeks.get_current_theme_week')
+    invalidate('theme_weeks.get_theme_week', week_id=week_id)
+    snapshots.refresh(get_session(), week_id)
+
+def _invalidate_videos(*week_ids):
+    invalidate('videos.get_videos')
+    invalidate('search.search')
+    invalidate('theme_weeks.get_theme_weeks')
+    for week_id in set(week_ids):
+        invalidate('theme_weeks.get_theme_week', week_id=week_id)
+        invalidate('theme_weeks.get_leaderboard', week_id=week_id)
+    snapshots.refresh(get_session(), *week_ids)
+
+def _invalidate_materials(*week_ids):
+    invalidate('theme_weeks.get_all_materials')
+    invalidate('search.search')
+    for week_id in set(week_ids):
+        invalidate('theme_weeks.get_theme_week', week_id=week_id)
+    snapshots.refresh(get_session(), *week_ids)
+
+def _bulk_import(resource, on_success=None):
+    try:
+        inserted, errors, week_ids = import_rows(resource)
+    except RowError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if inserted and resource in ('videos', 'materials'):
+        search.reset()
+    if inserted and on_success:
+        on_success(*week_ids)
+    return jsonify({'inserted': inserted, 'errors': errors}), 200
+
+@admin_bp.route('/<any(videos, materials):resource>/batch', methods=['PATCH'])
+@admin_required
+def batch_update(resource):
+    # [{"id": ..., "changes": {...}}, ...] или {"filter": {...}, "changes": {...}}; ответ — результат по каждой строке
+    try:
+        results, week_ids, moved = update_rows(resource, request.get_json(silent=True))
+    except RowError as e:
+        return jsonify({'error': str(e)}), 400
+
+    updated = sum(1 for result in results if result['status'] == 'updated')
+    if updated:
+        # Изменения уже закоммичены: сбой обновления индекса, кэшей или снимков не превращает ответ в 500
         try:
-            # Удалить префикс 'Bearer ', если он есть
-            if token.startswith('Bearer '):
-                token = token[7:]
-                
-            data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
-            if not data['is_admin']:
-                return jsonify({'error': 'Требуется доступ администратора'}), 403
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Срок действия токена истек'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Недействительный токен'}), 401
-            
-        return f(*args, **kwargs)
-    return decorated
+            search.reset()
+        except Exception:
+            logger.exception('Failed to reset the search index after batch update of %s', resource)
+        try:
+            if resource == 'videos':
+                if moved:
+                    forget_votes()
+                _invalidate_videos(*week_ids)
+            else:
+                _invalidate_materials(*week_ids)
+        except Exception:
+            logger.exception('Failed to invalidate caches or snapshots after batch update of %s', resource)
+    return jsonify({'updated': updated, 'results': results}), 200
+
+@admin_bp.route('/pool', methods=['GET'])
+@admin_required
+def get_pool_status():
+    return jsonify(pool_status()), 200
 
 # ============ USERS CRUD ============
 
 @admin_bp.route('/users', methods=['GET'])
-@token_required
+@admin_required
 def get_users():
-    session = SessionLocal()
-    try:
-        users = session.query(User).all()
-        return jsonify([{
-            'id': u.id,
-            'username': u.username,
-            'is_admin': u.is_admin,
-            'created_at': u.created_at.isoformat()
-        } for u in users]), 200
-    finally:
-        session.close()
+    fields = user_serializer.parse()
+    return list_response(lambda session: user_serializer.query(session, fields), User,
+                         user_serializer.dumper(fields))
 
 @admin_bp.route('/users', methods=['POST'])
-@token_required
+@admin_required
 def create_user():
     data = request.get_json()
-    session = SessionLocal()
+    session = get_session()
     
     try:
         user = User(
             username=data['username'],
-            password_hash=data['password'],
+            password_hash=hash_password(data['password']),
             is_admin=data.get('is_admin', False)
         )
         
@@ -68,31 +113,31 @@ def create_user():
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
+
+@admin_bp.route('/users/bulk', methods=['POST'])
+@admin_required
+def import_users():
+    return _bulk_import('users')
+
+@admin_bp.route('/users/bulk', methods=['GET'])
+@admin_required
+def export_users():
+    fields = user_export_serializer.default
+    return stream_response(lambda session: user_export_serializer.query(session, fields), User,
+                           user_export_serializer.dumper(fields))
 
 @admin_bp.route('/users/<string:user_id>', methods=['GET'])
-@token_required
+@admin_required
 def get_user(user_id):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            return jsonify({'error': 'Пользователь не найден'}), 404
-            
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'is_admin': user.is_admin,
-            'created_at': user.created_at.isoformat()
-        }), 200
-    finally:
-        session.close()
+    user = user_serializer.get(get_session(), user_id, user_serializer.parse())
+    if not user:
+        return jsonify({'error': 'Пользователь не найден'}), 404
+    return json_response(user)
 
 @admin_bp.route('/users/<string:user_id>', methods=['PUT'])
-@token_required
+@admin_required
 def update_user(user_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         user = session.query(User).filter_by(id=user_id).first()
@@ -105,20 +150,18 @@ def update_user(user_id):
         user.is_admin = data.get('is_admin', user.is_admin)
         
         if 'password' in data:
-            user.password_hash = data['password']
+            user.password_hash = hash_password(data['password'])
         
         session.commit()
         return jsonify({'message': 'Пользователь успешно обновлен'}), 200
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
 
 @admin_bp.route('/users/<string:user_id>', methods=['DELETE'])
-@token_required
+@admin_required
 def delete_user(user_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         user = session.query(User).filter_by(id=user_id).first()
@@ -131,34 +174,21 @@ def delete_user(user_id):
     except SQLAlchemyError as e:
         session.rollback()
         return jsonify({'error': f'Ошибка при удалении: {str(e)}'}), 400
-    finally:
-        session.close()
 
 # ============ THEME WEEKS CRUD ============
 
 @admin_bp.route('/theme-weeks', methods=['GET'])
-@token_required
+@admin_required
 def get_theme_weeks():
-    session = SessionLocal()
-    try:
-        weeks = session.query(ThemeWeek).all()
-        return jsonify([{
-            'id': w.id,
-            'title': w.title,
-            'description': w.description,
-            'start_date': w.start_date.isoformat(),
-            'end_date': w.end_date.isoformat(),
-            'result_url': w.result_url,
-            'image_url': w.image_url
-        } for w in weeks]), 200
-    finally:
-        session.close()
+    fields = theme_week_serializer.parse()
+    dump = theme_week_serializer.dumper(fields)
+    return json_response([dump(row) for row in theme_week_serializer.query(get_session(), fields)])
 
 @admin_bp.route('/theme-weeks', methods=['POST'])
-@token_required
+@admin_required
 def create_theme_week():
     data = request.get_json()
-    session = SessionLocal()
+    session = get_session()
     
     try:
         theme_week = ThemeWeek(
@@ -172,38 +202,24 @@ def create_theme_week():
         
         session.add(theme_week)
         session.commit()
+        _invalidate_week(theme_week.id)
         return jsonify({'message': 'Тематическая неделя успешно создана', 'id': theme_week.id}), 201
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
 
 @admin_bp.route('/theme-weeks/<string:week_id>', methods=['GET'])
-@token_required
+@admin_required
 def get_theme_week(week_id):
-    session = SessionLocal()
-    try:
-        week = session.query(ThemeWeek).filter_by(id=week_id).first()
-        if not week:
-            return jsonify({'error': 'Тематическая неделя не найдена'}), 404
-            
-        return jsonify({
-            'id': week.id,
-            'title': week.title,
-            'description': week.description,
-            'start_date': week.start_date.isoformat(),
-            'end_date': week.end_date.isoformat(),
-            'result_url': week.result_url,
-            'image_url': week.image_url
-        }), 200
-    finally:
-        session.close()
+    week = theme_week_serializer.get(get_session(), week_id, theme_week_serializer.parse())
+    if not week:
+        return jsonify({'error': 'Тематическая неделя не найдена'}), 404
+    return json_response(week)
 
 @admin_bp.route('/theme-weeks/<string:week_id>', methods=['PUT'])
-@token_required
+@admin_required
 def update_theme_week(week_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         week = session.query(ThemeWeek).filter_by(id=week_id).first()
@@ -220,57 +236,73 @@ def update_theme_week(week_id):
         week.image_url = data.get('image_url', week.image_url)
         
         session.commit()
+        _invalidate_week(week_id)
         return jsonify({'message': 'Тематическая неделя успешно обновлена'}), 200
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
+
+@admin_bp.route('/theme-weeks/<string:week_id>/finalize', methods=['POST'])
+@admin_required
+def finalize_theme_week(week_id):
+    data = request.get_json(silent=True) or {}
+    winners = data.get('winners', current_app.config['WEEK_WINNERS'])
+    if isinstance(winners, bool) or not isinstance(winners, int) or winners < 0:
+        return jsonify({'error': 'winners должен быть неотрицательным целым числом'}), 400
+    session = get_session()
+    
+    try:
+        week = lock_week(session, week_id)
+        if not week:
+            return jsonify({'error': 'Тематическая неделя не найдена'}), 404
+        
+        rows = finalize_week(session, week, winners, force=data.get('force', False))
+        session.commit()
+    except FinalizationError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except SQLAlchemyError as e:
+        session.rollback()
+        return jsonify({'error': f'Ошибка при подведении итогов: {str(e)}'}), 400
+    
+    invalidate_results(week_id)
+    snapshots.write_snapshot(session, week_id)
+    return jsonify({'message': 'Итоги недели подведены', 'results': rows}), 200
 
 @admin_bp.route('/theme-weeks/<string:week_id>', methods=['DELETE'])
-@token_required
+@admin_required
 def delete_theme_week(week_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         week = session.query(ThemeWeek).filter_by(id=week_id).first()
         if not week:
             return jsonify({'error': 'Тематическая неделя не найдена'}), 404
             
+        delete_results(session, week_id=week.id)
         session.delete(week)
         session.commit()
+        _invalidate_week(week_id)
+        search.reset()
         return jsonify({'message': 'Тематическая неделя успешно удалена'}), 200
     except SQLAlchemyError as e:
         session.rollback()
         return jsonify({'error': f'Ошибка при удалении: {str(e)}'}), 400
-    finally:
-        session.close()
 
 # ============ VIDEOS CRUD ============
 
 @admin_bp.route('/videos', methods=['GET'])
-@token_required
+@admin_required
 def get_videos():
-    session = SessionLocal()
-    try:
-        videos = session.query(Video).all()
-        return jsonify([{
-            'id': v.id,
-            'title': v.title,
-            'youtube_url': v.youtube_url,
-            'description': v.description,
-            'student_name': v.student_name,
-            'theme_week_id': v.theme_week_id,
-            'created_at': v.created_at.isoformat()
-        } for v in videos]), 200
-    finally:
-        session.close()
+    fields = video_serializer.parse()
+    return list_response(lambda session: video_serializer.query(session, fields), Video,
+                         video_serializer.dumper(fields))
 
 @admin_bp.route('/videos', methods=['POST'])
-@token_required
+@admin_required
 def create_video():
     data = request.get_json()
-    session = SessionLocal()
+    session = get_session()
     
     try:
         video = Video(
@@ -283,38 +315,44 @@ def create_video():
         
         session.add(video)
         session.commit()
+        search.index_document('video', video)
+        _invalidate_videos(video.theme_week_id)
         return jsonify({'message': 'Видео успешно создано', 'id': video.id}), 201
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
+
+@admin_bp.route('/videos/bulk', methods=['POST'])
+@admin_required
+def import_videos():
+    return _bulk_import('videos', _invalidate_videos)
+
+@admin_bp.route('/videos/bulk', methods=['GET'])
+@admin_required
+def export_videos():
+    theme_week_id = request.args.get('theme_week_id')
+    fields = video_serializer.parse()
+    
+    def build_query(session):
+        query = video_serializer.query(session, fields)
+        if theme_week_id:
+            query = query.filter(Video.theme_week_id == theme_week_id)
+        return query
+    
+    return stream_response(build_query, Video, video_serializer.dumper(fields))
 
 @admin_bp.route('/videos/<string:video_id>', methods=['GET'])
-@token_required
+@admin_required
 def get_video(video_id):
-    session = SessionLocal()
-    try:
-        video = session.query(Video).filter_by(id=video_id).first()
-        if not video:
-            return jsonify({'error': 'Видео не найдено'}), 404
-            
-        return jsonify({
-            'id': video.id,
-            'title': video.title,
-            'youtube_url': video.youtube_url,
-            'description': video.description,
-            'student_name': video.student_name,
-            'theme_week_id': video.theme_week_id,
-            'created_at': video.created_at.isoformat()
-        }), 200
-    finally:
-        session.close()
+    video = video_serializer.get(get_session(), video_id, video_serializer.parse())
+    if not video:
+        return jsonify({'error': 'Видео не найдено'}), 404
+    return json_response(video)
 
 @admin_bp.route('/videos/<string:video_id>', methods=['PUT'])
-@token_required
+@admin_required
 def update_video(video_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         video = session.query(Video).filter_by(id=video_id).first()
@@ -322,67 +360,62 @@ def update_video(video_id):
             return jsonify({'error': 'Видео не найдено'}), 404
             
         data = request.get_json()
+        old_week_id = video.theme_week_id
         
         video.title = data.get('title', video.title)
         video.youtube_url = data.get('youtube_url', video.youtube_url)
         video.description = data.get('description', video.description)
         video.student_name = data.get('student_name', video.student_name)
         video.theme_week_id = data.get('theme_week_id', video.theme_week_id)
+        move_tally(session, video.id, video.theme_week_id)
         
         session.commit()
+        search.index_document('video', video)
+        if old_week_id != video.theme_week_id:
+            forget_votes()
+        _invalidate_videos(old_week_id, video.theme_week_id)
         return jsonify({'message': 'Видео успешно обновлено'}), 200
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
 
 @admin_bp.route('/videos/<string:video_id>', methods=['DELETE'])
-@token_required
+@admin_required
 def delete_video(video_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         video = session.query(Video).filter_by(id=video_id).first()
         if not video:
             return jsonify({'error': 'Видео не найдено'}), 404
             
+        week_id = video.theme_week_id
+        delete_tally(session, video.id)
+        delete_results(session, video_id=video.id)
         session.delete(video)
         session.commit()
+        search.remove_document('video', video_id)
+        forget_votes()
+        _invalidate_videos(week_id)
         return jsonify({'message': 'Видео успешно удалено'}), 200
     except SQLAlchemyError as e:
         session.rollback()
         return jsonify({'error': f'Ошибка при удалении: {str(e)}'}), 400
-    finally:
-        session.close()
 
 # ============ MATERIALS CRUD ============
 
 @admin_bp.route('/materials', methods=['GET'])
-@token_required
+@admin_required
 def get_materials():
-    session = SessionLocal()
-    try:
-        materials = session.query(Material).all()
-        return jsonify([{
-            'id': m.id,
-            'title': m.title,
-            'description': m.description,
-            'student_name': m.student_name,
-            'material_type': m.material_type,
-            'url': m.url,
-            'is_winner': m.is_winner,
-            'theme_week_id': m.theme_week_id,
-            'created_at': m.created_at.isoformat()
-        } for m in materials]), 200
-    finally:
-        session.close()
+    fields = material_serializer.parse()
+    return list_response(lambda session: material_serializer.query(session, fields), Material,
+                         material_serializer.dumper(fields))
 
 @admin_bp.route('/materials', methods=['POST'])
-@token_required
+@admin_required
 def create_material():
     data = request.get_json()
-    session = SessionLocal()
+    session = get_session()
     
     try:
         material = Material(
@@ -397,40 +430,44 @@ def create_material():
         
         session.add(material)
         session.commit()
+        search.index_document('material', material)
+        _invalidate_materials(material.theme_week_id)
         return jsonify({'message': 'Материал успешно создан', 'id': material.id}), 201
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
+
+@admin_bp.route('/materials/bulk', methods=['POST'])
+@admin_required
+def import_materials():
+    return _bulk_import('materials', _invalidate_materials)
+
+@admin_bp.route('/materials/bulk', methods=['GET'])
+@admin_required
+def export_materials():
+    theme_week_id = request.args.get('theme_week_id')
+    fields = material_serializer.parse()
+    
+    def build_query(session):
+        query = material_serializer.query(session, fields)
+        if theme_week_id:
+            query = query.filter(Material.theme_week_id == theme_week_id)
+        return query
+    
+    return stream_response(build_query, Material, material_serializer.dumper(fields))
 
 @admin_bp.route('/materials/<string:material_id>', methods=['GET'])
-@token_required
+@admin_required
 def get_material(material_id):
-    session = SessionLocal()
-    try:
-        material = session.query(Material).filter_by(id=material_id).first()
-        if not material:
-            return jsonify({'error': 'Материал не найден'}), 404
-            
-        return jsonify({
-            'id': material.id,
-            'title': material.title,
-            'description': material.description,
-            'student_name': material.student_name,
-            'material_type': material.material_type,
-            'url': material.url,
-            'is_winner': material.is_winner,
-            'theme_week_id': material.theme_week_id,
-            'created_at': material.created_at.isoformat()
-        }), 200
-    finally:
-        session.close()
+    material = material_serializer.get(get_session(), material_id, material_serializer.parse())
+    if not material:
+        return jsonify({'error': 'Материал не найден'}), 404
+    return json_response(material)
 
 @admin_bp.route('/materials/<string:material_id>', methods=['PUT'])
-@token_required
+@admin_required
 def update_material(material_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         material = session.query(Material).filter_by(id=material_id).first()
@@ -438,6 +475,7 @@ def update_material(material_id):
             return jsonify({'error': 'Материал не найден'}), 404
             
         data = request.get_json()
+        old_week_id = material.theme_week_id
         
         material.title = data.get('title', material.title)
         material.description = data.get('description', material.description)
@@ -448,28 +486,29 @@ def update_material(material_id):
         material.theme_week_id = data.get('theme_week_id', material.theme_week_id)
         
         session.commit()
+        search.index_document('material', material)
+        _invalidate_materials(old_week_id, material.theme_week_id)
         return jsonify({'message': 'Материал успешно обновлен'}), 200
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        session.close()
 
 @admin_bp.route('/materials/<string:material_id>', methods=['DELETE'])
-@token_required
+@admin_required
 def delete_material(material_id):
-    session = SessionLocal()
+    session = get_session()
     
     try:
         material = session.query(Material).filter_by(id=material_id).first()
         if not material:
             return jsonify({'error': 'Материал не найден'}), 404
             
+        week_id = material.theme_week_id
         session.delete(material)
         session.commit()
+        search.remove_document('material', material_id)
+        _invalidate_materials(week_id)
         return jsonify({'message': 'Материал успешно удален'}), 200
     except SQLAlchemyError as e:
         session.rollback()
-        return jsonify({'error': f'Ошибка при удалении: {str(e)}'}), 400
-    finally:
-        session.close()
\ No newline at end of file
+        return jsonify({'error': f'Ошибка при удалении: {str(e)}'}), 400
\ No newline at end of file
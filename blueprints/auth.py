@@ -1,87 +1,98 @@
-from flask import Blueprint, request, jsonify
-from models import SessionLocal, User
-import jwt
-import datetime
-from config import Config
+from flask import Blueprint, request, jsonify, g
+from sqlalchemy.exc import IntegrityError
+from models import User
+from database import get_session
+from tokens import issue_token, token_required
+from ratelimit import rate_limited
+from passwords import hash_password, verify_password
 
 auth_bp = Blueprint('auth', __name__)
 
-@auth_bp.route('/register', methods=['POST'])
-def register():
-    data = request.get_json()
-    session = SessionLocal()
-    
-    try:
-        if session.query(User).filter_by(username=data['username']).first():
-            return jsonify({'error': 'Username already exists'}), 400
-        
-        user = User(
-            username=data['username'],
-            password_hash=data['password'],
-            is_admin=data.get('is_admin', False)
-        )
-        
-        session.add(user)
-        session.commit()
-        return jsonify({'message': 'User created successfully'}), 201
-    finally:
-        session.close()
+# Проверки и выборки ниже не зависят от Flask: их же вызывает ASGI-вход (asgi.py)
 
-@auth_bp.route('/login', methods=['POST'])
-def login():
-    data = request.get_json()
+def credentials_error(data):
     if not data:
-        return jsonify({'error': 'No data provided'}), 400
-        
+        return 'No data provided'
+    if not isinstance(data, dict):
+        return 'Request body must be a JSON object'
     if 'username' not in data:
-        return jsonify({'error': 'Username is required'}), 400
-        
+        return 'Username is required'
     if 'password' not in data:
-        return jsonify({'error': 'Password is required'}), 400
-        
-    session = SessionLocal()
-    
+        return 'Password is required'
+    if not isinstance(data['username'], str) or not isinstance(data['password'], str):
+        return 'Username and password must be strings'
+    return None
+
+def find_user(session, username):
+    return session.query(User.id, User.username, User.password_hash, User.is_admin) \
+        .filter(User.username == username) \
+        .first()
+
+def save_password_hash(session, user_id, password_hash):
+    # Открытый пароль или устаревшие параметры хэша: сохраняем пересчитанный
+    session.query(User).filter(User.id == user_id).update({User.password_hash: password_hash},
+                                                          synchronize_session=False)
+    session.commit()
+
+def create_user(session, username, password_hash, is_admin=False):
+    # False, если имя уже занято (в том числе параллельной регистрацией)
+    session.add(User(username=username, password_hash=password_hash, is_admin=is_admin))
     try:
-        user = session.query(User).filter_by(username=data['username']).first()
-        
-        if not user or user.password_hash != data['password']:
-            return jsonify({'error': 'Invalid credentials'}), 401
-        
-        # Generate JWT token
-        token = jwt.encode(
-            {
-                'user_id': user.id,
-                'username': user.username,
-                'is_admin': user.is_admin,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-            },
-            Config.SECRET_KEY,
-            algorithm="HS256"
-        )
-        
-        return jsonify({
-            'token': token,
-            'username': user.username,
-            'is_admin': user.is_admin
-        }), 200
-    finally:
-        session.close()
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return False
+    return True
+
+def login_payload(user):
+    return {
+        'token': issue_token(user),
+        'username': user.username,
+        'is_admin': user.is_admin
+    }
+
+@auth_bp.route('/register', methods=['POST'])
+@rate_limited
+def register():
+    data = request.get_json(silent=True)
+    error = credentials_error(data)
+    if error:
+        return jsonify({'error': error}), 400
+    session = get_session()
+
+    if find_user(session, data['username']):
+        return jsonify({'error': 'Username already exists'}), 400
+
+    if not create_user(session, data['username'], hash_password(data['password']), data.get('is_admin', False)):
+        return jsonify({'error': 'Username already exists'}), 400
+    return jsonify({'message': 'User created successfully'}), 201
+
+@auth_bp.route('/login', methods=['POST'])
+@rate_limited
+def login():
+    data = request.get_json(silent=True)
+    error = credentials_error(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    session = get_session()
+
+    user = find_user(session, data['username'])
+
+    valid, new_hash = verify_password(data['password'], user.password_hash if user else None)
+    if not valid:
+        return jsonify({'error': 'Invalid credentials'}), 401
+
+    if new_hash:
+        save_password_hash(session, user.id, new_hash)
+
+    return jsonify(login_payload(user)), 200
 
 @auth_bp.route('/me', methods=['GET'])
+@token_required
 def me():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'error': 'Token is missing'}), 401
-    try:
-        if token.startswith('Bearer '):
-            token = token[7:]
-        data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
-        return jsonify({
-            'user_id': data['user_id'],
-            'username': data['username'],
-            'is_admin': data['is_admin']
-        }), 200
-    except jwt.ExpiredSignatureError:
-        return jsonify({'error': 'Token has expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'error': 'Invalid token'}), 401
\ No newline at end of file
+    return jsonify({
+        'user_id': g.user['user_id'],
+        'username': g.user['username'],
+        'is_admin': g.user['is_admin']
+    }), 200
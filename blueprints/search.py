@@ -0,0 +1,23 @@
+from flask import Blueprint, request, jsonify
+from serializers import json_response
+from database import get_session
+from cache import cached
+import search as search_index
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/', methods=['GET'])
+@cached
+def search():
+    query = request.args.get('q', '').strip()
+    if not search_index.tokenize(query):
+        return jsonify({'error': 'Query parameter q is required'}), 400
+
+    kind = request.args.get('type')
+    if kind and kind not in search_index.KINDS:
+        return jsonify({'error': 'type must be video or material'}), 400
+
+    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(limit, 100))
+    results = search_index.search(get_session(), query, request.args.get('theme_week_id'), kind, limit)
+    return json_response(results)
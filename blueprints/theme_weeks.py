@@ -1,75 +1,160 @@
-from flask import Blueprint, request, jsonify, abort
-from models import SessionLocal, ThemeWeek, Material
-from datetime import datetime
-from sqlalchemy.orm.exc import NoResultFound
+from flask import Blueprint, request, abort, g
+from models import ThemeWeek, Material, Video, VoteTally, WeekResult
+from database import get_session
+from datetime import datetime, timezone
+from sqlalchemy import func, select, case, and_, or_
+from pagination import list_response
+from cache import cached
+import snapshots
+from serializers import (json_response, theme_week_serializer, video_serializer, material_serializer,
+                         THEME_WEEK_LIST_FIELDS)
+import live
 
 theme_weeks_bp = Blueprint('theme_weeks', __name__)
 
+# Выборки ниже не зависят от Flask: их же вызывает ASGI-вход (asgi.py)
+
+def list_weeks(session, fields):
+    dump = theme_week_serializer.dumper(fields)
+    return [dump(row) for row in theme_week_serializer.query(session, fields)]
+
+def parse_moment(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def current_week(session, fields, moment, with_ttl=True):
+    # Возвращает (неделя или None, сколько секунд ответ не изменится или None)
+    # Индекс (start_date, end_date): диапазон start_date <= moment читается с конца
+    week = theme_week_serializer.query(session, fields) \
+        .filter(ThemeWeek.start_date <= moment, ThemeWeek.end_date > moment) \
+        .order_by(ThemeWeek.start_date.desc()) \
+        .first()
+    week = theme_week_serializer.dumper(fields)(week) if week else None
+    if not with_ttl:
+        return week, None
+    
+    # Ответ не меняется до ближайшей границы: начала следующей недели или конца текущей
+    next_start = select(func.min(ThemeWeek.start_date)) \
+        .where(ThemeWeek.start_date > moment) \
+        .scalar_subquery()
+    current_end = select(func.min(ThemeWeek.end_date)) \
+        .where(ThemeWeek.start_date <= moment, ThemeWeek.end_date > moment) \
+        .scalar_subquery()
+    boundary = min(filter(None, session.query(next_start, current_end).one()), default=None)
+    return week, ((boundary - moment).total_seconds() if boundary is not None else None)
+
+def week_detail(session, week_id, fields):
+    week = theme_week_serializer.get(session, week_id, fields)
+    if not week:
+        return None
+    
+    dump_video = video_serializer.dumper(video_serializer.default)
+    dump_material = material_serializer.dumper(material_serializer.default)
+    videos = video_serializer.query(session, video_serializer.default) \
+        .filter(Video.theme_week_id == week_id) \
+        .order_by(Video.created_at, Video.id)
+    materials = material_serializer.query(session, material_serializer.default) \
+        .filter(Material.theme_week_id == week_id) \
+        .order_by(Material.created_at, Material.id)
+    week['videos'] = [dump_video(row) for row in videos]
+    week['materials'] = [dump_material(row) for row in materials]
+    return week
+
+def vote_snapshot(session, week_id):
+    # Текущие счётчики недели для начала SSE-потока или None, если недели нет
+    if not session.query(ThemeWeek.id).filter(ThemeWeek.id == week_id).scalar():
+        return None
+    return dict(session.query(VoteTally.video_id, VoteTally.votes_count)
+                .filter(VoteTally.theme_week_id == week_id))
+
+def leaderboard(session, week_id, top):
+    # Один запрос для обеих фаз недели. У подведённой рейтинг берётся из снимка week_results,
+    # у текущей — из агрегата vote_tallies; видео без голосов входят в обе с нулём.
+    # Места одни и те же: равные голоса делят место (1, 2, 2, 4), как в results.rank_totals
+    finalized = ThemeWeek.finalized_at.isnot(None)
+    live_votes = func.coalesce(VoteTally.votes_count, 0)
+    votes_count = case((finalized, WeekResult.votes_count), else_=live_votes).label('votes_count')
+    rank = case((finalized, WeekResult.rank),
+                else_=func.rank().over(order_by=live_votes.desc())).label('rank')
+    rows = session.query(Video.id, Video.title, Video.youtube_url, Video.student_name,
+                         votes_count, rank, and_(finalized, WeekResult.is_winner).label('is_winner')) \
+        .join(ThemeWeek, ThemeWeek.id == Video.theme_week_id) \
+        .outerjoin(VoteTally, VoteTally.video_id == Video.id) \
+        .outerjoin(WeekResult, and_(WeekResult.theme_week_id == ThemeWeek.id, WeekResult.video_id == Video.id)) \
+        .filter(Video.theme_week_id == week_id) \
+        .filter(or_(~finalized, WeekResult.video_id.isnot(None))) \
+        .order_by(rank, Video.id) \
+        .limit(top) \
+        .all()
+    return [{
+        'rank': row.rank,
+        'id': row.id,
+        'title': row.title,
+        'youtube_url': row.youtube_url,
+        'student_name': row.student_name,
+        'votes_count': row.votes_count,
+        'is_winner': bool(row.is_winner)
+    } for row in rows]
+
 @theme_weeks_bp.route('/', methods=['GET'])
+@cached
 def get_theme_weeks():
-    session = SessionLocal()
-    
+    fields = theme_week_serializer.parse(THEME_WEEK_LIST_FIELDS)
+    return json_response(list_weeks(get_session(), fields))
+
+@theme_weeks_bp.route('/current', methods=['GET'])
+@cached
+def get_current_theme_week():
+    at = request.args.get('at')
     try:
-        theme_weeks = session.query(ThemeWeek).all()
-        return jsonify([{
-            'id': week.id,
-            'title': week.title,
-            'description': week.description,
-            'start_date': week.start_date.isoformat(),
-            'end_date': week.end_date.isoformat(),
-            'videos_count': len(week.videos),
-            'result_url': week.result_url,
-            'image_url': week.image_url
-        } for week in theme_weeks]), 200
-    finally:
-        session.close()
+        moment = parse_moment(at) if at else datetime.utcnow()
+    except ValueError:
+        return json_response({'error': 'Invalid at timestamp'}, 400)
+    
+    week, ttl = current_week(get_session(), theme_week_serializer.parse(), moment, with_ttl=not at)
+    if ttl is not None:
+        g.cache_ttl = ttl
+    return json_response(week)
 
 @theme_weeks_bp.route('/<week_id>', methods=['GET'])
+@snapshots.served
+@cached
 def get_theme_week(week_id):
-    session = SessionLocal()
+    week = week_detail(get_session(), week_id, theme_week_serializer.parse())
+    if not week:
+        abort(404)
+    return json_response(week)
+
+@theme_weeks_bp.route('/<week_id>/leaderboard', methods=['GET'])
+@cached
+def get_leaderboard(week_id):
+    top = request.args.get('top', 10, type=int)
+    top = max(1, min(top, 100))
+    return json_response(leaderboard(get_session(), week_id, top))
+
+@theme_weeks_bp.route('/<week_id>/votes/stream', methods=['GET'])
+def stream_votes(week_id):
+    # В продакшене поток обслуживает asgi.py: на sync-воркере gunicorn каждый открытый
+    # поток занимал бы воркер целиком. VOTE_STREAM_WSGI включает его здесь для разработки.
+    if not live.wsgi_enabled():
+        return json_response({'error': 'Vote stream is served by the ASGI app'}, 404)
     
-    try:
-        week = session.query(ThemeWeek).filter(ThemeWeek.id == week_id).first()
-        if not week:
-            abort(404)
-        return jsonify({
-            'id': week.id,
-            'title': week.title,
-            'description': week.description,
-            'start_date': week.start_date.isoformat(),
-            'end_date': week.end_date.isoformat(),
-            'result_url': week.result_url,
-            'image_url': week.image_url,
-            'videos': [{
-                'id': video.id,
-                'title': video.title,
-                'description': video.description,
-                'youtube_url': video.youtube_url,
-                'student_name': video.student_name,
-                'theme_week_id': video.theme_week_id,
-                'created_at': video.created_at.isoformat()
-            } for video in week.videos]
-        }), 200
-    finally:
-        session.close()
+    # Подписка раньше снимка: голос между ними может прийти дважды, но не потеряется
+    subscription = live.subscribe(week_id)
+    session = get_session()
+    snapshot = vote_snapshot(session, week_id)
+    # Соединение возвращается в пул сразу, а не когда клиент закроет поток
+    session.close()
+    if snapshot is None:
+        subscription.close()
+        abort(404)
+    return live.stream_response(subscription, snapshot)
 
 @theme_weeks_bp.route('/materials', methods=['GET'])
+@cached
 def get_all_materials():
-    session = SessionLocal()
-    try:
-        materials = session.query(Material).all()
-        return jsonify([
-            {
-                'id': m.id,
-                'title': m.title,
-                'description': m.description,
-                'student_name': m.student_name,
-                'material_type': m.material_type,
-                'url': m.url,
-                'is_winner': m.is_winner,
-                'theme_week_id': m.theme_week_id,
-                'created_at': m.created_at.isoformat()
-            } for m in materials
-        ]), 200
-    finally:
-        session.close() 
\ No newline at end of file
+    fields = material_serializer.parse()
+    return list_response(lambda session: material_serializer.query(session, fields), Material,
+                         material_serializer.dumper(fields))
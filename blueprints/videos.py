@@ -1,103 +1,94 @@
-from flask import Blueprint, request, jsonify
-from models import SessionLocal, Video, Vote
-import jwt
-from config import Config
-from functools import wraps
+from flask import Blueprint, request, jsonify, g
+from tokens import token_required
+from ratelimit import rate_limited
+from models import Video, ThemeWeek
+from database import get_session
+from votes import submit_vote, user_votes, has_voted, remember_vote, VoteTimeout
+import live
+from pagination import list_response
+from cache import cached, invalidate
+from serializers import video_serializer, VIDEO_LIST_FIELDS
 from datetime import datetime
 
 videos_bp = Blueprint('videos', __name__)
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-            
-        try:
-            # Remove 'Bearer ' prefix if present
-            if token.startswith('Bearer '):
-                token = token[7:]
-                
-            data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
-            request.user_id = data['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-            
-        return f(*args, **kwargs)
-    return decorated
+# Выборки ниже не зависят от Flask: их же вызывает ASGI-вход (asgi.py)
+
+def video_list_query(fields, theme_week_id=None):
+    def build_query(session):
+        query = video_serializer.query(session, fields)
+        if theme_week_id:
+            query = query.filter(Video.theme_week_id == theme_week_id)
+        return query
+    return build_query
+
+def vote_target(session, video_id):
+    # (theme_week_id, finalized_at) видео или None
+    return session.query(Video.theme_week_id, ThemeWeek.finalized_at) \
+        .join(ThemeWeek, ThemeWeek.id == Video.theme_week_id) \
+        .filter(Video.id == video_id) \
+        .first()
 
 @videos_bp.route('/', methods=['GET'])
+@cached
 def get_videos():
-    session = SessionLocal()
-    
-    try:
-        theme_week_id = request.args.get('theme_week_id')
-        query = session.query(Video)
-        
-        if theme_week_id:
-            query = query.filter_by(theme_week_id=theme_week_id)
-        
-        videos = query.all()
-        return jsonify([{
-            'id': video.id,
-            'title': video.title,
-            'youtube_url': video.youtube_url,
-            'description': video.description,
-            'author': video.author.username,
-            'theme_week_id': video.theme_week_id,
-            'votes_count': len(video.votes),
-            'created_at': video.created_at.isoformat()
-        } for video in videos]), 200
-    finally:
-        session.close()
+    fields = video_serializer.parse(VIDEO_LIST_FIELDS)
+    return list_response(video_list_query(fields, request.args.get('theme_week_id')), Video,
+                         video_serializer.dumper(fields))
 
 @videos_bp.route('/', methods=['POST'])
 @token_required
 def create_video():
     data = request.get_json()
-    session = SessionLocal()
+    session = get_session()
     
-    try:
-        video = Video(
-            title=data['title'],
-            youtube_url=data['youtube_url'],
-            description=data.get('description'),
-            user_id=request.user_id,
-            theme_week_id=data['theme_week_id']
-        )
-        
-        session.add(video)
-        session.commit()
-        return jsonify({'message': 'Video created successfully'}), 201
-    finally:
-        session.close()
+    video = Video(
+        title=data['title'],
+        youtube_url=data['youtube_url'],
+        description=data.get('description'),
+        user_id=g.user_id,
+        theme_week_id=data['theme_week_id']
+    )
+    
+    session.add(video)
+    session.commit()
+    return jsonify({'message': 'Video created successfully'}), 201
+
+@videos_bp.route('/my-votes', methods=['GET'])
+@token_required
+def my_votes():
+    theme_week_id = request.args.get('theme_week_id')
+    votes = user_votes(get_session(), g.user_id)
+    return jsonify(sorted(video_id for video_id, week_id in votes.items()
+                          if not theme_week_id or week_id == theme_week_id)), 200
 
 @videos_bp.route('/<video_id>/vote', methods=['POST'])
 @token_required
+@rate_limited
 def vote_video(video_id):
-    session = SessionLocal()
+    # Повтор отсекается по кэшу голосов, не занимая соединение из пула
+    if has_voted(g.user_id, video_id):
+        return jsonify({'error': 'You have already voted for this video'}), 400
+    
+    session = get_session()
+    video = vote_target(session, video_id)
+    if not video:
+        return jsonify({'error': 'Video not found'}), 404
+    if video.finalized_at is not None:
+        return jsonify({'error': 'Voting for this theme week is closed'}), 403
+    theme_week_id = video.theme_week_id
     
     try:
-        # Проверяем, не голосовал ли уже пользователь
-        existing_vote = session.query(Vote).filter_by(
-            user_id=request.user_id,
-            video_id=video_id
-        ).first()
-        
-        if existing_vote:
-            return jsonify({'error': 'You have already voted for this video'}), 400
-        
-        vote = Vote(
-            user_id=request.user_id,
-            video_id=video_id
-        )
-        
-        session.add(vote)
-        session.commit()
-        return jsonify({'message': 'Vote recorded successfully'}), 201
-    finally:
-        session.close() 
\ No newline at end of file
+        created = submit_vote(session, g.user_id, video_id, theme_week_id)
+    except VoteTimeout:
+        response = jsonify({'error': 'Vote could not be recorded, try again'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    remember_vote(g.user_id, video_id, theme_week_id)
+    if not created:
+        return jsonify({'error': 'You have already voted for this video'}), 400
+    
+    live.publish_vote(theme_week_id, video_id)
+    invalidate('videos.get_videos')
+    invalidate('theme_weeks.get_leaderboard', week_id=theme_week_id)
+    return jsonify({'message': 'Vote recorded successfully'}), 201
@@ -0,0 +1,340 @@
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy.exc import SQLAlchemyError
+from models import ThemeWeek, User, Video, Material
+from database import get_session
+from passwords import is_hashed, hash_many
+from votes import move_tallies
+
+BATCH_SIZE = 1000
+# Сколько строк может затронуть один пакетный PATCH (списком id или фильтром)
+MAX_UPDATE_ROWS = 1000
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/ndjson')
+
+RESOURCES = {
+    'users': {
+        'model': User,
+        'required': ('username', 'password_hash'),
+        'optional': {'is_admin': False},
+        'aliases': {'password': 'password_hash'},
+        'unique': ('id', 'username'),
+        'password': 'password_hash'
+    },
+    'videos': {
+        'model': Video,
+        'required': ('title', 'youtube_url', 'student_name', 'theme_week_id'),
+        'optional': {'description': None},
+        'aliases': {},
+        'unique': ('id',),
+        'updatable': ('title', 'youtube_url', 'description', 'student_name', 'theme_week_id'),
+        # Только колонки с индексом: фильтр не должен читать таблицу целиком
+        'filters': ('id', 'theme_week_id')
+    },
+    'materials': {
+        'model': Material,
+        'required': ('title', 'student_name', 'material_type', 'url', 'theme_week_id'),
+        'optional': {'description': None, 'is_winner': False},
+        'aliases': {},
+        'unique': ('id',),
+        'updatable': ('title', 'description', 'student_name', 'material_type', 'url', 'is_winner',
+                      'theme_week_id'),
+        'filters': ('id', 'theme_week_id')
+    }
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+def iter_payload():
+    # NDJSON читается построчно из потока запроса, JSON-массив — целиком
+    if request.mimetype in NDJSON_MIMETYPES:
+        for number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, RowError(f'Invalid JSON: {e}')
+        return
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise RowError('Expected a JSON array or NDJSON body')
+    yield from enumerate(data, start=1)
+
+
+def _check_value(model, field, value):
+    column = model.__table__.c[field]
+    python_type = column.type.python_type
+    if python_type is str:
+        if not isinstance(value, str):
+            raise RowError(f'{field} must be a string')
+        length = getattr(column.type, 'length', None)
+        if length and len(value) > length:
+            raise RowError(f'{field} is longer than {length} characters')
+    elif python_type is bool and not isinstance(value, bool):
+        raise RowError(f'{field} must be a boolean')
+    return value
+
+
+def validate_row(item, spec, week_ids, seen):
+    if isinstance(item, RowError):
+        raise item
+    if not isinstance(item, dict):
+        raise RowError('Row must be a JSON object')
+
+    model = spec['model']
+    item = {spec['aliases'].get(key, key): value for key, value in item.items()}
+    row = {}
+
+    for field in spec['required']:
+        if item.get(field) in (None, ''):
+            raise RowError(f'{field} is required')
+        row[field] = _check_value(model, field, item[field])
+    for field, default in spec['optional'].items():
+        value = item.get(field, default)
+        row[field] = value if value is None else _check_value(model, field, value)
+
+    if item.get('id') is not None:
+        row['id'] = _check_value(model, 'id', item['id'])
+    if item.get('created_at') is not None:
+        try:
+            row['created_at'] = datetime.fromisoformat(item['created_at'])
+        except (TypeError, ValueError):
+            raise RowError('created_at must be an ISO 8601 timestamp')
+
+    if 'theme_week_id' in row and row['theme_week_id'] not in week_ids:
+        raise RowError(f"Theme week {row['theme_week_id']} not found")
+
+    for field in spec['unique']:
+        if field in row:
+            if row[field] in seen[field]:
+                raise RowError(f'Duplicate {field} in payload: {row[field]}')
+            seen[field].add(row[field])
+    return row
+
+
+def _flush(session, spec, batch, errors):
+    model = spec['model']
+
+    # Уникальные значения, которые уже есть в базе
+    for field in spec['unique']:
+        values = [row[field] for _, row in batch if field in row]
+        if not values:
+            continue
+        column = getattr(model, field)
+        existing = {value for (value,) in session.query(column).filter(column.in_(values))}
+        if existing:
+            for number, row in batch:
+                if row.get(field) in existing:
+                    errors.append({'row': number, 'error': f'{field} already exists: {row[field]}'})
+            batch = [(number, row) for number, row in batch if row.get(field) not in existing]
+
+    if not batch:
+        return []
+
+    # Пароли хэшируются всей пачкой в пуле; готовые хэши (например, из экспорта) переносятся как есть
+    field = spec.get('password')
+    if field:
+        pending = [row for _, row in batch if not is_hashed(row[field])]
+        for row, value in zip(pending, hash_many([row[field] for row in pending])):
+            row[field] = value
+
+    # executemany требует одинаковый набор колонок, поэтому группируем по ключам
+    groups = {}
+    for _, row in batch:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    try:
+        for rows in groups.values():
+            session.execute(model.__table__.insert(), rows)
+        session.commit()
+        return [row for _, row in batch]
+    except SQLAlchemyError:
+        session.rollback()
+
+    # Пачка не прошла целиком: вставляем построчно, чтобы найти ошибочные строки
+    inserted = []
+    for number, row in batch:
+        try:
+            session.execute(model.__table__.insert(), [row])
+            session.commit()
+            inserted.append(row)
+        except SQLAlchemyError as e:
+            session.rollback()
+            errors.append({'row': number, 'error': str(e.orig if hasattr(e, 'orig') else e)})
+    return inserted
+
+
+def import_rows(resource, batch_size=BATCH_SIZE):
+    spec = RESOURCES[resource]
+    model = spec['model']
+    session = get_session()
+
+    week_ids = set()
+    if 'theme_week_id' in model.__table__.c:
+        week_ids = {week_id for (week_id,) in session.query(ThemeWeek.id)}
+
+    seen = {field: set() for field in spec['unique']}
+    errors = []
+    inserted = 0
+    touched_weeks = set()
+    batch = []
+    for number, item in iter_payload():
+        try:
+            batch.append((number, validate_row(item, spec, week_ids, seen)))
+        except RowError as e:
+            errors.append({'row': number, 'error': str(e)})
+            continue
+        if len(batch) < batch_size:
+            continue
+        rows = _flush(session, spec, batch, errors)
+        inserted += len(rows)
+        touched_weeks.update(row['theme_week_id'] for row in rows if 'theme_week_id' in row)
+        batch = []
+
+    rows = _flush(session, spec, batch, errors)
+    inserted += len(rows)
+    touched_weeks.update(row['theme_week_id'] for row in rows if 'theme_week_id' in row)
+
+    errors.sort(key=lambda error: error['row'])
+    return inserted, errors, touched_weeks
+
+
+def validate_changes(spec, changes):
+    if not isinstance(changes, dict) or not changes:
+        raise RowError('changes must be a non-empty object')
+    model = spec['model']
+    row = {}
+    for field, value in changes.items():
+        if field not in spec['updatable']:
+            raise RowError(f'{field} cannot be updated')
+        if value is None:
+            if not model.__table__.c[field].nullable:
+                raise RowError(f'{field} cannot be null')
+            row[field] = None
+        else:
+            row[field] = _check_value(model, field, value)
+    return row
+
+
+def _filter_ids(session, spec, conditions):
+    # {'theme_week_id': '...', 'student_name': ['a', 'b']} -> id подходящих строк
+    model = spec['model']
+    if not isinstance(conditions, dict) or not conditions:
+        raise RowError('filter must be a non-empty object')
+    query = session.query(model.id)
+    for field, value in conditions.items():
+        if field not in spec['filters']:
+            raise RowError(f'Cannot filter by {field}')
+        column = getattr(model, field)
+        if isinstance(value, list):
+            query = query.filter(column.in_([_check_value(model, field, item) for item in value]))
+        else:
+            query = query.filter(column == _check_value(model, field, value))
+    ids = [item_id for (item_id,) in query.limit(MAX_UPDATE_ROWS + 1)]
+    if len(ids) > MAX_UPDATE_ROWS:
+        raise RowError(f'Filter matches more than {MAX_UPDATE_ROWS} rows')
+    return ids
+
+
+def _parse_batch(session, spec, payload):
+    # Список {id, changes} или {filter, changes} -> [(номер, id, changes или RowError)]
+    if isinstance(payload, dict) and 'filter' in payload:
+        changes = validate_changes(spec, payload.get('changes'))
+        ids = _filter_ids(session, spec, payload['filter'])
+        return [(number, item_id, changes) for number, item_id in enumerate(ids, start=1)]
+
+    if not isinstance(payload, list):
+        raise RowError('Expected a JSON array of {id, changes} or an object with filter and changes')
+    if len(payload) > MAX_UPDATE_ROWS:
+        raise RowError(f'At most {MAX_UPDATE_ROWS} rows per batch')
+
+    items = []
+    seen = set()
+    for number, item in enumerate(payload, start=1):
+        item_id = item.get('id') if isinstance(item, dict) else None
+        try:
+            if not isinstance(item_id, str) or not item_id:
+                raise RowError('id is required')
+            if item_id in seen:
+                raise RowError(f'Duplicate id in payload: {item_id}')
+            seen.add(item_id)
+            items.append((number, item_id, validate_changes(spec, item.get('changes'))))
+        except RowError as e:
+            items.append((number, item_id, e))
+    return items
+
+
+def _apply(session, spec, groups):
+    model = spec['model']
+    for changes, ids in groups:
+        session.query(model).filter(model.id.in_(ids)).update(dict(changes), synchronize_session=False)
+        if model is Video and 'theme_week_id' in dict(changes):
+            move_tallies(session, ids, dict(changes)['theme_week_id'])
+
+
+def update_rows(resource, payload):
+    # Строки с одинаковыми изменениями обновляются одним UPDATE ... WHERE id IN (...).
+    # Все пачки — в одной транзакции, каждая в своей точке сохранения: пачка с ошибкой
+    # откатывается целиком, остальные фиксируются одним коммитом. Возвращает результаты по строкам, затронутые недели
+    # (старые и новые) и id, у которых сменилась неделя.
+    spec = RESOURCES[resource]
+    model = spec['model']
+    session = get_session()
+    items = _parse_batch(session, spec, payload)
+
+    valid = [(number, item_id, changes) for number, item_id, changes in items if not isinstance(changes, RowError)]
+    current = {}
+    for start in range(0, len(valid), BATCH_SIZE):
+        ids = [item_id for _, item_id, _ in valid[start:start + BATCH_SIZE]]
+        current.update(session.query(model.id, model.theme_week_id).filter(model.id.in_(ids)))
+    new_weeks = {changes['theme_week_id'] for _, _, changes in valid if changes.get('theme_week_id')}
+    existing_weeks = {week_id for (week_id,) in session.query(ThemeWeek.id).filter(ThemeWeek.id.in_(new_weeks))} \
+        if new_weeks else set()
+
+    results = {}
+    groups = {}
+    for number, item_id, changes in items:
+        if isinstance(changes, RowError):
+            results[number] = {'row': number, 'id': item_id, 'status': 'error', 'error': str(changes)}
+        elif item_id not in current:
+            results[number] = {'row': number, 'id': item_id, 'status': 'not_found'}
+        elif 'theme_week_id' in changes and changes['theme_week_id'] not in existing_weeks:
+            results[number] = {'row': number, 'id': item_id, 'status': 'error',
+                               'error': f"Theme week {changes['theme_week_id']} not found"}
+        else:
+            groups.setdefault(tuple(sorted(changes.items())), []).append((number, item_id))
+
+    failed = {}
+    for changes, rows in groups.items():
+        try:
+            with session.begin_nested():
+                _apply(session, spec, [(changes, [item_id for _, item_id in rows])])
+        except SQLAlchemyError as e:
+            failed[changes] = str(e.orig if hasattr(e, 'orig') else e)
+    try:
+        session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        failed = dict.fromkeys(groups, str(e.orig if hasattr(e, 'orig') else e))
+
+    week_ids = set()
+    moved = []
+    for changes, rows in groups.items():
+        new_week = dict(changes).get('theme_week_id')
+        for number, item_id in rows:
+            if changes in failed:
+                results[number] = {'row': number, 'id': item_id, 'status': 'error', 'error': failed[changes]}
+                continue
+            results[number] = {'row': number, 'id': item_id, 'status': 'updated'}
+            week_ids.add(current[item_id])
+            if new_week and new_week != current[item_id]:
+                week_ids.add(new_week)
+                moved.append(item_id)
+
+    return [results[number] for number in sorted(results)], week_ids, moved
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, url_for, make_response, Response, g
+import compression
+
+# Заголовки ответа, которые сохраняются вместе с телом
+CACHED_HEADERS = ('X-Next-Cursor',)
+
+_backend = None
+
+
+class MemoryCache:
+    # LRU с TTL в памяти процесса
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, query):
+        key = (path, query)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, entry = item
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, path, query, entry, ttl=None):
+        # Срок не длиннее общего TTL: инвалидация из админки чистит только свой процесс,
+        # остальные воркеры отдают старый ответ до истечения записи
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+        key = (path, query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self._entries.move_to_end(key)
+            self._paths.setdefault(path, set()).add(query)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete_path(self, path):
+        with self._lock:
+            for query in self._paths.pop(path, ()):
+                self._entries.pop((path, query), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        queries = self._paths.get(key[0])
+        if queries is not None:
+            queries.discard(key[1])
+            if not queries:
+                del self._paths[key[0]]
+
+
+class FileCache:
+    # Кэш в каталоге на диске: общий для всех воркеров gunicorn на одной машине.
+    # Файл записи: строка с JSON-метаданными, затем тело ответа и его сжатые варианты
+    # (длины — в метаданных); mtime файла — момент истечения.
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, directory, max_entries=1024, ttl=60):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path_dir(self, path):
+        return os.path.join(self.directory, hashlib.sha1(path.encode()).hexdigest())
+
+    def _entry_file(self, path, query):
+        return os.path.join(self._path_dir(path), hashlib.sha1(query.encode()).hexdigest())
+
+    def get(self, path, query):
+        try:
+            with open(self._entry_file(path, query), 'rb') as f:
+                meta = json.loads(f.readline())
+                if meta['expires'] < time.time():
+                    return None
+                data = f.read()
+            end = len(data) - sum(size for _, size in meta['encoded'])
+            meta['body'] = data[:end]
+            encoded = {}
+            for encoding, size in meta['encoded']:
+                encoded[encoding] = data[end:end + size]
+                end += size
+            meta['encoded'] = encoded
+            return meta
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, path, query, entry, ttl=None):
+        directory = self._path_dir(path)
+        os.makedirs(directory, exist_ok=True)
+        meta = {key: value for key, value in entry.items() if key not in ('body', 'encoded')}
+        meta['encoded'] = [[encoding, len(data)] for encoding, data in entry['encoded'].items()]
+        meta['expires'] = time.time() + (ttl or self.ttl)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(meta).encode() + b'\n')
+                f.write(entry['body'])
+                for data in entry['encoded'].values():
+                    f.write(data)
+            os.utime(tmp, (meta['expires'], meta['expires']))
+            os.replace(tmp, self._entry_file(path, query))
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def delete_path(self, path):
+        directory = self._path_dir(path)
+        # Переименование атомарно: параллельные чтения сразу видят промах
+        trash = f'{directory}.{os.getpid()}.{threading.get_ident()}.deleted'
+        try:
+            os.rename(directory, trash)
+        except OSError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _prune(self):
+        files = []
+        now = time.time()
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                full = os.path.join(root, name)
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    continue
+                if stat.st_mtime < now:
+                    os.unlink(full)
+                else:
+                    files.append((stat.st_mtime, full))
+        files.sort()
+        for _, full in files[:max(0, len(files) - self.max_entries)]:
+            try:
+                os.unlink(full)
+            except OSError:
+                pass
+
+
+def init_app(app):
+    global _backend
+    kind = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+    ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+    max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+
+    if kind == 'memory':
+        _backend = MemoryCache(max_entries=max_entries, ttl=ttl)
+    elif kind == 'file':
+        _backend = FileCache(app.config['RESPONSE_CACHE_DIR'], max_entries=max_entries, ttl=ttl)
+    elif kind in (None, '', 'none'):
+        _backend = None
+    else:
+        raise ValueError(f'Unknown RESPONSE_CACHE_BACKEND: {kind}')
+
+
+def query_key(items):
+    return '&'.join(f'{key}={value}' for key, value in sorted(items))
+
+
+def lookup(path, query):
+    return _backend.get(path, query) if _backend is not None else None
+
+
+def make_entry(body, mimetype, headers):
+    # Сжатые варианты хранятся рядом с телом: горячий ответ сжимается один раз, а не на каждый запрос
+    return {
+        'body': body,
+        'encoded': compression.encode_all(body, mimetype),
+        'etag': hashlib.sha1(body).hexdigest(),
+        'mimetype': mimetype,
+        'headers': {name: headers[name] for name in CACHED_HEADERS if name in headers}
+    }
+
+
+def _serve(response, entry):
+    response.set_etag(entry['etag'])
+    if entry['encoded']:
+        compression.vary(response)
+        encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+        if encoding in entry['encoded']:
+            compression.apply(response, encoding, entry['encoded'][encoding])
+    return response
+
+
+def store(path, query, entry, ttl=None):
+    if _backend is not None:
+        _backend.set(path, query, entry, ttl)
+
+
+def cached(view):
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        backend = _backend
+        if backend is None or request.args.get('stream'):
+            return view(*args, **kwargs)
+
+        query = query_key(request.args.items(multi=True))
+        entry = backend.get(request.path, query)
+        if entry is not None:
+            # Слабое сравнение: сжатому варианту клиент присылает W/"etag"
+            if request.if_none_match.contains_weak(entry['etag']):
+                response = Response(status=304)
+                response.set_etag(entry['etag'], weak=bool(entry['encoded']))
+                if entry['encoded']:
+                    compression.vary(response)
+            else:
+                response = Response(entry['body'], status=200, mimetype=entry['mimetype'])
+                response.headers.update(entry['headers'])
+                _serve(response, entry)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+
+        # View может сократить срок записи через g.cache_ttl (секунды); продлить — только
+        # в общем для воркеров бэкенде 'file', где инвалидация видна всем
+        ttl = g.pop('cache_ttl', None)
+        if ttl is not None and ttl <= 0:
+            return response
+
+        entry = make_entry(response.get_data(), response.mimetype, response.headers)
+        backend.set(request.path, query, entry, ttl)
+
+        response.headers['X-Cache'] = 'MISS'
+        return _serve(response, entry).make_conditional(request)
+    return decorated
+
+
+def invalidate(endpoint, **values):
+    if _backend is not None:
+        invalidate_path(url_for(endpoint, **values))
+
+
+def invalidate_path(path):
+    if _backend is not None:
+        _backend.delete_path(path)
@@ -0,0 +1,90 @@
+import gzip
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/csv')
+
+_settings = {'enabled': True, 'min_bytes': 1024, 'gzip_level': 6, 'brotli_quality': 5}
+
+
+def encodings():
+    # В порядке предпочтения: brotli плотнее gzip на повторяющемся JSON
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=_settings['brotli_quality'])
+    return gzip.compress(data, compresslevel=_settings['gzip_level'], mtime=0)
+
+
+def compressible(mimetype, size):
+    return _settings['enabled'] and mimetype in COMPRESSIBLE and size >= _settings['min_bytes']
+
+
+def encode_all(body, mimetype):
+    # Сжатые варианты тела для записи кэша: считаются один раз при заполнении,
+    # вариант не хранится, если он не меньше исходного
+    if not compressible(mimetype, len(body)):
+        return {}
+    encoded = {}
+    for encoding in encodings():
+        data = compress(body, encoding)
+        if len(data) < len(body):
+            encoded[encoding] = data
+    return encoded
+
+
+def negotiate(accept_encoding):
+    # Лучшая из поддерживаемых кодировок, которую принимает клиент, или None
+    accepted = parse_accept_header(accept_encoding)
+    best = None
+    for encoding in encodings():
+        quality = accepted.quality(encoding)
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def apply(response, encoding, data):
+    # Отдаёт уже сжатое тело; ETag становится слабым — байты другие, содержимое то же
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def vary(response):
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    _settings['enabled'] = app.config.get('COMPRESSION_ENABLED', True)
+    _settings['min_bytes'] = app.config.get('COMPRESSION_MIN_BYTES', 1024)
+    _settings['gzip_level'] = app.config.get('COMPRESSION_GZIP_LEVEL', 6)
+    _settings['brotli_quality'] = app.config.get('COMPRESSION_BROTLI_QUALITY', 5)
+
+    @app.after_request
+    def compress_response(response):
+        # Ответы из кэша приходят уже сжатыми (cache.cached); здесь — всё остальное.
+        # Потоковые ответы (SSE, выгрузки ?stream=) не трогаем: они отдаются по мере готовности.
+        if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers \
+                or response.status_code < 200 or response.status_code in (204, 304) \
+                or not compressible(response.mimetype, response.calculate_content_length() or 0):
+            return response
+
+        vary(response)
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        body = response.get_data()
+        data = compress(body, encoding)
+        return apply(response, encoding, data) if len(data) < len(body) else response
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,3 +9,95 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     CORS_HEADERS = 'Content-Type'
+
+    # Пул соединений: суммарно workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) должно укладываться в max_connections
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+    # Реплики для чтения (через запятую): GET-запросы идут туда; после записи клиент
+    # DB_REPLICA_STICKY_SECONDS читает из primary; упавшая реплика пропускается DB_REPLICA_RETRY_SECONDS
+    DATABASE_REPLICA_URLS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+    DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+    DB_REPLICA_RETRY_SECONDS = int(os.getenv('DB_REPLICA_RETRY_SECONDS', 10))
+
+    # Хэширование паролей: 'scrypt' или 'pbkdf2_sha256'; стоимость можно поднимать — старые хэши
+    # пересчитываются при входе. Хэши считаются в пуле из PASSWORD_HASH_WORKERS потоков (0 — по числу CPU);
+    # WSGI-поток ждёт хэш, ASGI-вход (asgi.py) на это время отпускает цикл событий
+    PASSWORD_HASH_ALGORITHM = os.getenv('PASSWORD_HASH_ALGORITHM', 'scrypt')
+    PASSWORD_SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', 2 ** 14))
+    PASSWORD_SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', 8))
+    PASSWORD_SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', 1))
+    PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0))
+
+    # ASGI-вход (asgi.py): async-URL базы; по умолчанию выводится из DATABASE_URL (asyncpg/aiosqlite)
+    ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL')
+
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 4096))
+
+    # Кэш публичных GET-ответов: 'memory' (LRU в процессе), 'file' (общий для воркеров) или 'none'
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'restart-response-cache'))
+
+    # Сжатие ответов (gzip, brotli при установленном пакете brotli) от COMPRESSION_MIN_BYTES;
+    # для кэшируемых GET сжатые варианты хранятся в кэше рядом с телом
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
+    # Снимки подведённых недель: JSON-файлы в SNAPSHOT_DIR, отдаются с диска с Cache-Control max-age
+    SNAPSHOTS_ENABLED = os.getenv('SNAPSHOTS_ENABLED', 'true').lower() == 'true'
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'restart-snapshots'))
+    SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', 86400))
+
+    # Буферизованная запись голосов: многострочные INSERT раз в VOTE_BUFFER_FLUSH_MS или по VOTE_BUFFER_MAX_ROWS
+    VOTE_BUFFER_ENABLED = os.getenv('VOTE_BUFFER_ENABLED', 'false').lower() == 'true'
+    VOTE_BUFFER_MAX_ROWS = int(os.getenv('VOTE_BUFFER_MAX_ROWS', 200))
+    VOTE_BUFFER_FLUSH_MS = int(os.getenv('VOTE_BUFFER_FLUSH_MS', 5))
+
+    # Кэш голосов пользователя для /api/videos/my-votes и отсечения повторных голосов
+    VOTED_CACHE_SIZE = int(os.getenv('VOTED_CACHE_SIZE', 10000))
+    VOTED_CACHE_TTL = int(os.getenv('VOTED_CACHE_TTL', 30))
+
+    # Сколько первых мест получают статус победителя при подведении итогов недели
+    WEEK_WINNERS = int(os.getenv('WEEK_WINNERS', 3))
+
+    # SSE-поток голосов: дельты склеиваются в окне VOTE_STREAM_INTERVAL_MS;
+    # транспорт между воркерами: 'local' (один процесс) или 'postgres' (LISTEN/NOTIFY).
+    # Поток обслуживает asgi.py; VOTE_STREAM_WSGI отдаёт его и из app:app — только для разработки,
+    # на sync-воркерах gunicorn каждый открытый поток занимает воркер
+    VOTE_STREAM_TRANSPORT = os.getenv('VOTE_STREAM_TRANSPORT', 'local')
+    VOTE_STREAM_INTERVAL_MS = int(os.getenv('VOTE_STREAM_INTERVAL_MS', 250))
+    VOTE_STREAM_HEARTBEAT_SECONDS = int(os.getenv('VOTE_STREAM_HEARTBEAT_SECONDS', 15))
+    VOTE_STREAM_WSGI = os.getenv('VOTE_STREAM_WSGI', 'false').lower() == 'true'
+
+    # Ограничение частоты (token bucket) по IP и пользователю: 'memory' (в процессе),
+    # 'shared' (mmap-файл, общий для воркеров) или 'none'; лимиты — 'N/second|minute|hour|day'
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    # Сколько доверенных прокси (nginx, балансировщик) стоит перед приложением: адрес клиента
+    # берётся из X-Forwarded-For. 0 — без прокси, иначе все клиенты делят ведро адреса прокси
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+    RATE_LIMIT_SHARED_PATH = os.getenv('RATE_LIMIT_SHARED_PATH', os.path.join(tempfile.gettempdir(), 'restart-ratelimit'))
+    RATE_LIMITS = {
+        'auth.login': os.getenv('RATE_LIMIT_LOGIN', '10/minute'),
+        'auth.register': os.getenv('RATE_LIMIT_REGISTER', '5/minute'),
+        'videos.vote_video': os.getenv('RATE_LIMIT_VOTE', '60/minute')
+    }
+
+    # Метрики и логирование медленных запросов; METRICS_SAMPLE_RATE — доля запросов с замером латентности и SQL
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 1.0))
+    SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 100))
+    # /metrics доступен администратору или по 'Authorization: Bearer <METRICS_TOKEN>'.
+    # При нескольких воркерах нужен METRICS_MULTIPROCESS_DIR: воркеры раз в METRICS_WRITE_SECONDS
+    # пишут туда счётчики, и /metrics суммирует их; каталог очищается при деплое
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR')
+    METRICS_WRITE_SECONDS = int(os.getenv('METRICS_WRITE_SECONDS', 5))
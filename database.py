@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.orm import sessionmaker
+from config import Config
+
+
+class PoolMetrics:
+    # Счётчики пула: сколько соединений занято и сколько ждали выдачи
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.max_in_use = 0
+        self.connects = 0
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def connected(self):
+        with self._lock:
+            self.connects += 1
+
+    def checked_out(self):
+        with self._lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def waited(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+
+    def reset(self):
+        self.__init__()
+
+    def snapshot(self, pool):
+        with self._lock:
+            data = {
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkout_wait_total_seconds': round(self.checkout_wait_total, 6),
+                'checkout_wait_max_seconds': round(self.checkout_wait_max, 6)
+            }
+        if pool is None:
+            return data
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if method is not None:
+                data[f'pool_{name}'] = method()
+        return data
+
+
+def engine_options(config=Config, url=None):
+    options = {
+        'pool_pre_ping': config.DB_POOL_PRE_PING,
+        'pool_recycle': config.DB_POOL_RECYCLE
+    }
+    # У SQLite свой пул без размеров и очереди
+    if not (url or config.SQLALCHEMY_DATABASE_URI).startswith('sqlite'):
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT
+        )
+    return options
+
+
+def _instrument(engine, metrics):
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+        metrics.connected()
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        # Соединение, открытое до fork, в дочернем процессе не используем и не закрываем:
+        # без ссылки на него инвалидация не отправит Terminate в сокет родителя (атрибуты SQLAlchemy 1.4)
+        if connection_record.info.get('pid') != os.getpid():
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError('Connection belongs to another process')
+        metrics.checked_out()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checked_in()
+
+
+class ReplicaSet:
+    # Реплики для чтения: round-robin по здоровым; упавшая реплика выключается
+    # на retry_interval секунд, после чего следующий запрос пробует её снова
+
+    def __init__(self, engines, retry_interval=10):
+        self.engines = engines
+        self.retry_interval = retry_interval
+        self._down_until = [0.0] * len(engines)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def choose(self):
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                index = self._next
+                self._next = (self._next + 1) % len(self.engines)
+                if self._down_until[index] <= now:
+                    return self.engines[index]
+        return None
+
+    def mark_down(self, engine):
+        with self._lock:
+            self._down_until[self.engines.index(engine)] = time.monotonic() + self.retry_interval
+
+    def healthy(self):
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for until in self._down_until if until <= now)
+
+
+_engine = None
+_replicas = None
+_engine_lock = threading.Lock()
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+pool_metrics = PoolMetrics()
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Cookie с моментом, до которого чтения клиента идут в primary (после его записи)
+PRIMARY_COOKIE = 'db_primary_until'
+
+
+def get_engine():
+    # Движок создаётся при первом обращении: импорт приложения не делает I/O
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not Config.SQLALCHEMY_DATABASE_URI:
+                    raise RuntimeError('DATABASE_URL is not configured')
+                engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, **engine_options())
+                _instrument(engine, pool_metrics)
+                _engine = engine
+    return _engine
+
+
+def get_replicas():
+    global _replicas
+    if _replicas is None and Config.DATABASE_REPLICA_URLS:
+        with _engine_lock:
+            if _replicas is None:
+                engines = []
+                for url in Config.DATABASE_REPLICA_URLS:
+                    engine = create_engine(url, **engine_options(url=url))
+                    _instrument(engine, pool_metrics)
+                    engines.append(engine)
+                _replicas = ReplicaSet(engines, Config.DB_REPLICA_RETRY_SECONDS)
+    return _replicas
+
+
+def _reset_after_fork():
+    # Новый пул без закрытия унаследованных сокетов: они принадлежат родителю
+    for engine in [_engine] + (_replicas.engines if _replicas is not None else []):
+        if engine is not None:
+            engine.pool = engine.pool.recreate()
+    pool_metrics.reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def SessionLocal(**kwargs):
+    # Session factory for standalone scripts (outside of Flask)
+    return _session_factory(bind=get_engine(), **kwargs)
+
+
+def _wants_replica():
+    if request.method not in SAFE_METHODS:
+        return False
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) <= time.time()
+    except ValueError:
+        return True
+
+
+def _connect(engine):
+    session = _session_factory(bind=engine)
+    started = time.perf_counter()
+    try:
+        session.connection()
+    except exc.DBAPIError:
+        session.close()
+        raise
+    pool_metrics.waited(time.perf_counter() - started)
+    return session
+
+
+def get_session():
+    # Одна сессия на запрос; закрывается в teardown приложения.
+    # Чтения идут в реплику, если она настроена и доступна, иначе в primary.
+    if 'db_session' not in g:
+        replicas = get_replicas() if has_request_context() and _wants_replica() else None
+        replica = replicas.choose() if replicas is not None else None
+        session = None
+        if replica is not None:
+            try:
+                session = _connect(replica)
+            except exc.DBAPIError:
+                replicas.mark_down(replica)
+        g.db_session = session or _connect(get_engine())
+        g.db_replica = session is not None
+    return g.db_session
+
+
+def pool_status():
+    data = pool_metrics.snapshot(_engine.pool if _engine is not None else None)
+    if _replicas is not None:
+        data['replicas'] = len(_replicas.engines)
+        data['replicas_healthy'] = _replicas.healthy()
+    return data
+
+
+def init_app(app):
+    @app.after_request
+    def stick_to_primary(response):
+        # После записи клиент какое-то время читает из primary и видит свои изменения
+        if Config.DATABASE_REPLICA_URLS and request.method not in SAFE_METHODS \
+                and 'db_session' in g and response.status_code < 400:
+            seconds = app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(PRIMARY_COOKIE, str(time.time() + seconds), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        session = g.pop('db_session', None)
+        if session is not None:
+            if exception is not None:
+                session.rollback()
+            session.close()
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import Counter
+from flask import Response
+from sqlalchemy import text
+from database import get_engine
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'vote_deltas'
+# pg_notify ограничен 8000 байт: столько пар (uuid, дельта) в одном уведомлении помещается с запасом
+NOTIFY_CHUNK = 100
+
+
+class Subscription:
+    # loop — цикл событий ASGI-подписчика: его будят через call_soon_threadsafe из потоков брокера
+
+    def __init__(self, broker, week_id, loop=None):
+        self.broker = broker
+        self.week_id = week_id
+        self._pending = Counter()
+        self._cond = threading.Condition()
+        self._loop = loop
+        self._ready = asyncio.Event() if loop is not None else None
+
+    def push(self, deltas):
+        with self._cond:
+            self._pending.update(deltas)
+            self._cond.notify()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                # Цикл уже закрыт: подписчик отключается
+                pass
+
+    def _take(self):
+        with self._cond:
+            deltas, self._pending = self._pending, Counter()
+        return deltas
+
+    def wait(self, timeout):
+        # Всё, что накопилось с прошлого вызова, одним Counter; пустой — если истёк timeout
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+        return self._take()
+
+    async def wait_async(self, timeout):
+        # То же для ASGI: ждёт в цикле событий, не занимая поток
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+        return self._take()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalTransport:
+    # Доставка только внутри процесса: подходит для одного воркера
+
+    def start(self, broker):
+        self.broker = broker
+
+    def send(self, batch):
+        for week_id, deltas in batch.items():
+            self.broker.deliver(week_id, deltas)
+
+
+class PostgresTransport:
+    # Дельты рассылаются через NOTIFY, каждый воркер слушает канал отдельным соединением
+    # и раздаёт полученное своим подписчикам (включая дельты, отправленные им самим)
+
+    def __init__(self, channel=NOTIFY_CHANNEL):
+        self.channel = channel
+
+    def start(self, broker):
+        self.broker = broker
+        threading.Thread(target=self._listen, name='vote-stream-listener', daemon=True).start()
+
+    def send(self, batch):
+        with get_engine().begin() as connection:
+            for week_id, deltas in batch.items():
+                items = list(deltas.items())
+                for start in range(0, len(items), NOTIFY_CHUNK):
+                    payload = json.dumps({'w': week_id, 'd': dict(items[start:start + NOTIFY_CHUNK])})
+                    connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                                       {'channel': self.channel, 'payload': payload})
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception('Vote stream listener failed, reconnecting')
+                time.sleep(1)
+
+    def _listen_once(self):
+        # Отдельное соединение вне пула: LISTEN держит его всё время жизни воркера
+        fairy = get_engine().raw_connection()
+        fairy.detach()
+        connection = fairy.connection
+        try:
+            connection.autocommit = True
+            connection.cursor().execute(f'LISTEN {self.channel}')
+            while True:
+                if select.select([connection], [], [], 30) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    message = json.loads(connection.notifies.pop(0).payload)
+                    self.broker.deliver(message['w'], Counter(message['d']))
+        finally:
+            connection.close()
+
+
+TRANSPORTS = {
+    'local': LocalTransport,
+    'postgres': PostgresTransport
+}
+
+
+class Broker:
+    # Голоса копятся в исходящем Counter по неделям и уходят в транспорт не чаще раза в interval;
+    # транспорт возвращает их в deliver() каждого воркера, откуда они расходятся подписчикам
+
+    def __init__(self, transport=None, interval=0.25):
+        self.transport = transport or LocalTransport()
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._outgoing = {}
+        self._subscribers = {}
+        self._thread = None
+        self._pid = None
+
+    def publish(self, week_id, video_id, amount=1):
+        with self._cond:
+            self._ensure_threads()
+            self._outgoing.setdefault(week_id, Counter())[video_id] += amount
+            self._cond.notify()
+
+    def subscribe(self, week_id, loop=None):
+        subscription = Subscription(self, week_id, loop)
+        with self._cond:
+            self._ensure_threads()
+            self._subscribers.setdefault(week_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._cond:
+            subscribers = self._subscribers.get(subscription.week_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.week_id]
+
+    def deliver(self, week_id, deltas):
+        with self._cond:
+            subscribers = list(self._subscribers.get(week_id, ()))
+        for subscription in subscribers:
+            subscription.push(deltas)
+
+    def subscriber_count(self):
+        with self._cond:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _ensure_threads(self):
+        # Потоки создаются лениво и заново после fork (воркеры gunicorn)
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._outgoing = {}
+            self._subscribers = {}
+            self._thread = threading.Thread(target=self._run, name='vote-stream', daemon=True)
+            self._thread.start()
+            self.transport.start(self)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._outgoing:
+                    self._cond.wait()
+                batch, self._outgoing = self._outgoing, {}
+            try:
+                self.transport.send(batch)
+            except Exception:
+                logger.exception('Failed to send vote deltas')
+            time.sleep(self.interval)
+
+
+_broker = None
+_settings = {'interval': 0.25, 'heartbeat': 15, 'wsgi': False}
+
+
+def init_app(app):
+    global _broker
+    _settings['interval'] = app.config.get('VOTE_STREAM_INTERVAL_MS', 250) / 1000
+    _settings['heartbeat'] = app.config.get('VOTE_STREAM_HEARTBEAT_SECONDS', 15)
+    _settings['wsgi'] = app.config.get('VOTE_STREAM_WSGI', False)
+    transport = TRANSPORTS[app.config.get('VOTE_STREAM_TRANSPORT', 'local')]()
+    _broker = Broker(transport, _settings['interval'])
+
+
+def publish_vote(week_id, video_id, amount=1):
+    if _broker is not None and week_id:
+        _broker.publish(week_id, video_id, amount)
+
+
+def subscribe(week_id, loop=None):
+    return _broker.subscribe(week_id, loop)
+
+
+def wsgi_enabled():
+    return _settings['wsgi']
+
+
+def _event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+STREAM_HEADERS = {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+
+async def event_stream(subscription, snapshot):
+    # Поток для ASGI-входа: открытый поток — это корутина, а не воркер или поток gunicorn
+    try:
+        yield ('retry: 3000\n' + _event('snapshot', snapshot)).encode()
+        while True:
+            deltas = await subscription.wait_async(_settings['heartbeat'])
+            if not deltas:
+                yield b': keepalive\n\n'
+                continue
+            yield _event('votes', deltas).encode()
+            await asyncio.sleep(_settings['interval'])
+    finally:
+        subscription.close()
+
+
+def stream_response(subscription, snapshot):
+    # Для WSGI (VOTE_STREAM_WSGI): каждый открытый поток держит воркер или поток gunicorn
+    # Генератор не использует контекст запроса: сессия БД закрывается сразу после возврата из view
+    def generate():
+        yield 'retry: 3000\n' + _event('snapshot', snapshot)
+        while True:
+            deltas = subscription.wait(_settings['heartbeat'])
+            if not deltas:
+                yield ': keepalive\n\n'
+                continue
+            yield _event('votes', deltas)
+            # Всё, что придёт за interval, уйдёт следующим событием одной пачкой
+            time.sleep(_settings['interval'])
+
+    headers = {name: value for name, value in STREAM_HEADERS.items() if name != 'Content-Type'}
+    response = Response(generate(), mimetype='text/event-stream', headers=headers)
+    response.call_on_close(subscription.close)
+    return response
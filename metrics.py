@@ -0,0 +1,320 @@
+import glob
+import hmac
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from flask import g, request, has_request_context, jsonify, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from database import pool_status
+from tokens import check_authorization
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+POOL_COUNTERS = ('connects', 'checkouts', 'checkout_wait_total_seconds')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+
+    def merge(self, counts, total):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.total += total
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.total}'
+        yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.statements = {}
+        self.db_statements = {}
+        self.db_seconds = {}
+        self.slow_requests = 0
+        self.slow_queries = 0
+
+    def record_request(self, endpoint, method, status, duration=None, statements=None, db_seconds=None):
+        key = (endpoint, method)
+        with self._lock:
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            if duration is None:
+                return
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(duration)
+            self.statements.setdefault(key, Histogram(STATEMENT_BUCKETS)).observe(statements)
+            self.db_statements[key] = self.db_statements.get(key, 0) + statements
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + db_seconds
+
+    def reset(self):
+        self.__init__()
+
+    def count_slow(self, kind):
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    def state(self):
+        # Снимок счётчиков в JSON-совместимом виде: так воркеры делятся ими через SharedStore
+        with self._lock:
+            return {
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'latency': [[*key, histogram.counts, histogram.total] for key, histogram in self.latency.items()],
+                'statements': [[*key, histogram.counts, histogram.total]
+                               for key, histogram in self.statements.items()],
+                'db_statements': [[*key, count] for key, count in self.db_statements.items()],
+                'db_seconds': [[*key, seconds] for key, seconds in self.db_seconds.items()],
+                'slow_requests': self.slow_requests,
+                'slow_queries': self.slow_queries
+            }
+
+    def merge(self, state):
+        with self._lock:
+            for name, buckets in (('latency', LATENCY_BUCKETS), ('statements', STATEMENT_BUCKETS)):
+                histograms = getattr(self, name)
+                for endpoint, method, counts, total in state[name]:
+                    histograms.setdefault((endpoint, method), Histogram(buckets)).merge(counts, total)
+            for name in ('requests', 'db_statements', 'db_seconds'):
+                values = getattr(self, name)
+                for *key, value in state[name]:
+                    values[tuple(key)] = values.get(tuple(key), 0) + value
+            self.slow_requests += state['slow_requests']
+            self.slow_queries += state['slow_queries']
+
+    def render(self, extra=None):
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def labels(key):
+            return f'endpoint="{key[0]}",method="{key[1]}"'
+
+        with self._lock:
+            header('http_requests_total', 'counter', 'Requests by endpoint, method and status.')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{{labels((endpoint, method))},status="{status}"}} {count}')
+
+            header('http_request_duration_seconds', 'histogram', 'Request latency of sampled requests.')
+            for key, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('http_request_duration_seconds', labels(key)))
+
+            header('http_request_db_statements', 'histogram', 'SQL statements per sampled request.')
+            for key, histogram in sorted(self.statements.items()):
+                lines.extend(histogram.lines('http_request_db_statements', labels(key)))
+
+            header('db_statements_total', 'counter', 'SQL statements issued by sampled requests.')
+            for key, count in sorted(self.db_statements.items()):
+                lines.append(f'db_statements_total{{{labels(key)}}} {count}')
+
+            header('db_time_seconds_total', 'counter', 'Time spent in SQL by sampled requests.')
+            for key, seconds in sorted(self.db_seconds.items()):
+                lines.append(f'db_time_seconds_total{{{labels(key)}}} {seconds}')
+
+            header('slow_requests_total', 'counter', 'Requests over SLOW_REQUEST_MS.')
+            lines.append(f'slow_requests_total {self.slow_requests}')
+            header('slow_queries_total', 'counter', 'SQL statements over SLOW_QUERY_MS.')
+            lines.append(f'slow_queries_total {self.slow_queries}')
+
+        for name, (kind, value) in (extra or {}).items():
+            header(name, kind, name.replace('_', ' ') + '.')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class SharedStore:
+    # Счётчики всех воркеров gunicorn: каждый процесс раз в interval секунд пишет свой снимок
+    # в <directory>/<pid>.json, а /metrics складывает все файлы. Файлы завершившихся воркеров
+    # остаются, чтобы их счётчики не пропадали; каталог очищается при деплое
+    # (как у prometheus_client в multiprocess-режиме).
+
+    def __init__(self, directory, interval=5):
+        self.directory = directory
+        self.interval = interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def ensure_thread(self):
+        # Поток создаётся лениво и заново после fork
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name='metrics-store', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write()
+            except OSError:
+                logger.exception('Failed to write metrics to %s', self.directory)
+
+    def write(self):
+        data = json.dumps({'registry': registry.state(), 'pool': pool_status()})
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self._path(os.getpid()))
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def collect(self):
+        # Счётчики — сумма по всем файлам; состояние пула — только по живым процессам
+        self.write()
+        combined = Registry()
+        pool = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            combined.merge(data['registry'])
+            alive = _alive(int(os.path.basename(path)[:-len('.json')]))
+            for name, value in data['pool'].items():
+                if alive or name in POOL_COUNTERS:
+                    pool[name] = pool.get(name, 0) + value
+        return combined, pool
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+# Счётчики родителя принадлежат его файлу: дочерний процесс начинает с нуля
+os.register_at_fork(after_in_child=registry.reset)
+_store = None
+_settings = {'slow_query': None, 'token': None}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('metrics_sampled'):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts or not has_request_context() or not g.get('metrics_sampled'):
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    g.metrics_statements += 1
+    g.metrics_db_seconds += elapsed
+
+    threshold = _settings['slow_query']
+    if threshold is not None and elapsed >= threshold:
+        registry.count_slow('slow_queries')
+        logger.warning('Slow query (%.1f ms) in %s %s: %s', elapsed * 1000, request.method, request.path,
+                       ' '.join(statement.split()))
+
+
+def _authorized():
+    # Статический токен для Prometheus (METRICS_TOKEN) или JWT администратора
+    header = request.headers.get('Authorization', '')
+    token = _settings['token']
+    if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+        return None
+    payload, error = check_authorization(header)
+    if error:
+        return jsonify({'error': error}), 401
+    if not payload.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    return None
+
+
+def init_app(app):
+    global _store
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    sample_rate = app.config.get('METRICS_SAMPLE_RATE', 1.0)
+    slow_request = app.config.get('SLOW_REQUEST_MS', 500) / 1000
+    _settings['slow_query'] = app.config.get('SLOW_QUERY_MS', 100) / 1000
+    _settings['token'] = app.config.get('METRICS_TOKEN')
+    directory = app.config.get('METRICS_MULTIPROCESS_DIR')
+    _store = SharedStore(directory, app.config.get('METRICS_WRITE_SECONDS', 5)) if directory else None
+
+    # Слушатели на классе Engine: покрывают и движки, созданные позже (лениво)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_sampled = sample_rate >= 1 or random.random() < sample_rate
+        g.metrics_statements = 0
+        g.metrics_db_seconds = 0.0
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record(response):
+        endpoint = request.endpoint or 'unmatched'
+        if _store is not None:
+            _store.ensure_thread()
+        if not g.get('metrics_sampled'):
+            registry.record_request(endpoint, request.method, response.status_code)
+            return response
+
+        duration = time.perf_counter() - g.metrics_started
+        registry.record_request(endpoint, request.method, response.status_code,
+                                duration, g.metrics_statements, g.metrics_db_seconds)
+        if duration >= slow_request:
+            registry.count_slow('slow_requests')
+            logger.warning('Slow request (%.1f ms, %d queries, %.1f ms in DB): %s %s', duration * 1000,
+                           g.metrics_statements, g.metrics_db_seconds * 1000, request.method, request.full_path)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        error = _authorized()
+        if error:
+            return error
+        # Без METRICS_MULTIPROCESS_DIR счётчики только этого процесса: годится для одного воркера
+        source, pool = _store.collect() if _store is not None else (registry, pool_status())
+        extra = {
+            f'db_pool_{name}': ('counter' if name in POOL_COUNTERS else 'gauge', value)
+            for name, value in pool.items()
+        }
+        return Response(source.render(extra), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,173 @@
+import sys
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from database import get_engine
+from models import Base
+import votes
+import search
+
+# Номер advisory-lock'а Postgres, чтобы два процесса не мигрировали одновременно
+ADVISORY_LOCK_ID = 7301
+
+MIGRATIONS = []
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, default=func.now())
+)
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return register
+
+
+def _create_tables(connection, *names):
+    # checkfirst делает миграцию идемпотентной для баз, созданных старым create_all
+    Base.metadata.create_all(connection, tables=[Base.metadata.tables[name] for name in names], checkfirst=True)
+
+
+def _add_column(connection, table, name):
+    # Свежие базы получают колонку уже в миграции 1 (таблицы строятся по текущим моделям)
+    if name in {column['name'] for column in inspect(connection).get_columns(table)}:
+        return
+    column = Base.metadata.tables[table].c[name]
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}'))
+
+
+def _create_index(connection, table, name):
+    index = next(index for index in Base.metadata.tables[table].indexes if index.name == name)
+    index.create(connection, checkfirst=True)
+
+
+@migration(1, 'initial schema')
+def initial_schema(connection):
+    _create_tables(connection, 'users', 'theme_weeks', 'videos', 'votes', 'materials')
+
+
+@migration(2, 'vote tallies')
+def vote_tallies(connection):
+    _create_tables(connection, 'vote_tallies')
+    votes.rebuild_tallies(Session(bind=connection))
+
+
+@migration(3, 'secondary indexes for filters, joins and keyset ordering')
+def secondary_indexes(connection):
+    for table, name in (
+        ('users', 'ix_users_created'),
+        ('videos', 'ix_videos_created'),
+        ('videos', 'ix_videos_theme_week_created'),
+        ('votes', 'ix_votes_video_id'),
+        ('materials', 'ix_materials_created'),
+        ('materials', 'ix_materials_theme_week_created'),
+    ):
+        _create_index(connection, table, name)
+
+
+@migration(4, 'full-text search indexes')
+def search_indexes(connection):
+    # В SQLite поиск идёт по индексу в памяти процесса (search.InvertedIndex)
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in ('videos', 'materials'):
+        connection.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING gin ({search.SEARCH_VECTOR_SQL})'
+        ))
+
+
+@migration(5, 'theme week date range index')
+def theme_week_dates_index(connection):
+    _create_index(connection, 'theme_weeks', 'ix_theme_weeks_dates')
+
+
+@migration(6, 'week finalization and results snapshot')
+def week_results(connection):
+    _add_column(connection, 'theme_weeks', 'finalized_at')
+    _create_tables(connection, 'week_results')
+
+
+@migration(7, 'uniform created_at format in SQLite')
+def sqlite_created_at(connection):
+    # Раньше created_at заполнялся func.now(): SQLite писал его без микросекунд, а значения из Python —
+    # с ними. Строки сравниваются посимвольно, и курсор пагинации перескакивал или зацикливался.
+    if connection.dialect.name != 'sqlite':
+        return
+    for table in ('users', 'theme_weeks', 'videos', 'votes', 'materials'):
+        connection.execute(text(
+            f"UPDATE {table} SET created_at = created_at || '.000000' WHERE length(created_at) = 19"
+        ))
+
+
+
+@migration(8, 'search index version')
+def search_version(connection):
+    _create_tables(connection, 'search_versions')
+    if connection.execute(text('SELECT count(*) FROM search_versions')).scalar() == 0:
+        connection.execute(text('INSERT INTO search_versions (id, version) VALUES (1, 0)'))
+
+def applied_versions(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    return {row.version for row in connection.execute(schema_migrations.select())}
+
+
+def current_version(engine=None):
+    with (engine or get_engine()).begin() as connection:
+        return max(applied_versions(connection), default=0)
+
+
+def upgrade(engine=None, target=None, echo=print):
+    engine = engine or get_engine()
+    with engine.connect() as lock_connection:
+        postgres = engine.dialect.name == 'postgresql'
+        if postgres:
+            lock_connection.execute(text('SELECT pg_advisory_lock(:id)'), {'id': ADVISORY_LOCK_ID})
+        try:
+            with engine.begin() as connection:
+                applied = applied_versions(connection)
+
+            for version, description, fn in MIGRATIONS:
+                if version in applied or (target is not None and version > target):
+                    continue
+                # Каждая миграция — в своей транзакции вместе с отметкой о применении
+                with engine.begin() as connection:
+                    fn(connection)
+                    connection.execute(schema_migrations.insert().values(version=version, description=description))
+                echo(f'Applied migration {version}: {description}')
+        finally:
+            if postgres:
+                lock_connection.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': ADVISORY_LOCK_ID})
+
+
+def init_app(app):
+    import click
+    from flask.cli import AppGroup
+
+    db_cli = AppGroup('db', help='Schema migrations.')
+
+    @db_cli.command('upgrade')
+    @click.option('--target', type=int, default=None, help='Stop after this version.')
+    def upgrade_command(target):
+        upgrade(target=target)
+
+    @db_cli.command('current')
+    def current_command():
+        print(current_version())
+
+    app.cli.add_command(db_cli)
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    if command == 'upgrade':
+        upgrade()
+    elif command == 'current':
+        print(current_version())
+    else:
+        sys.exit(f'Unknown command: {command}')
@@ -1,17 +1,12 @@
+from datetime import datetime
 from uuid import uuid4
-from sqlalchemy import create_engine, Column, String, DateTime, ForeignKey, Boolean, Text, UniqueConstraint
+from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, Text, Integer, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.sql import func
-from config import Config
+from sqlalchemy.orm import relationship
+from database import SessionLocal
 
-# Create engine and Base for standalone use
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
 Base = declarative_base()
 
-# Session factory for standalone scripts (outside of Flask)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
 class User(Base):
     __tablename__ = 'users'
     
@@ -19,9 +14,11 @@ class User(Base):
     username = Column(String(80), unique=True, nullable=False)
     password_hash = Column(String(128), nullable=False)
     is_admin = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     votes = relationship('Vote', backref='voter', lazy=True)
+    
+    __table_args__ = (Index('ix_users_created', 'created_at', 'id'),)
 
 class ThemeWeek(Base):
     __tablename__ = 'theme_weeks'
@@ -32,10 +29,14 @@ class ThemeWeek(Base):
     result_url = Column(String(500), nullable=False)
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow)
     image_url = Column(String(500), nullable=False)
+    # Время подведения итогов; после него голосование за неделю закрыто
+    finalized_at = Column(DateTime)
     
     videos = relationship('Video', backref='theme_week', lazy=True)
+    
+    __table_args__ = (Index('ix_theme_weeks_dates', 'start_date', 'end_date'),)
 
 class Video(Base):
     __tablename__ = 'videos'
@@ -45,11 +46,16 @@ class Video(Base):
     youtube_url = Column(String(500), nullable=False)
     description = Column(Text)
     student_name = Column(String(100), nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     theme_week_id = Column(String(36), ForeignKey('theme_weeks.id'), nullable=False)
     
     votes = relationship('Vote', backref='video', lazy=True)
+    
+    __table_args__ = (
+        Index('ix_videos_created', 'created_at', 'id'),
+        Index('ix_videos_theme_week_created', 'theme_week_id', 'created_at', 'id'),
+    )
 
 class Vote(Base):
     __tablename__ = 'votes'
@@ -57,9 +63,12 @@ class Vote(Base):
     id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
     user_id = Column(String(36), ForeignKey('users.id'), nullable=False)
     video_id = Column(String(36), ForeignKey('videos.id'), nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow)
     
-    __table_args__ = (UniqueConstraint('user_id', 'video_id', name='unique_vote'),)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'video_id', name='unique_vote'),
+        Index('ix_votes_video_id', 'video_id'),
+    )
 
 class Material(Base):
     __tablename__ = 'materials'
@@ -71,10 +80,42 @@ class Material(Base):
     material_type = Column(String(20), nullable=False)  # 'youtube', 'image', 'pdf', 'video', etc.
     url = Column(String(500), nullable=False)  # ссылка на Cloudinary или YouTube
     is_winner = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow)
 
     theme_week_id = Column(String(36), ForeignKey('theme_weeks.id'), nullable=False)
     theme_week = relationship('ThemeWeek', backref='materials')
 
-# Create all tables in the database
-Base.metadata.create_all(engine) 
\ No newline at end of file
+    __table_args__ = (
+        Index('ix_materials_created', 'created_at', 'id'),
+        Index('ix_materials_theme_week_created', 'theme_week_id', 'created_at', 'id'),
+    )
+
+class VoteTally(Base):
+    __tablename__ = 'vote_tallies'
+
+    # Агрегат голосов, обновляется при каждом новом голосе (см. votes.py)
+    video_id = Column(String(36), ForeignKey('videos.id'), primary_key=True)
+    theme_week_id = Column(String(36), ForeignKey('theme_weeks.id'), nullable=False)
+    votes_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index('ix_vote_tallies_week_count', 'theme_week_id', 'votes_count'),)
+
+class WeekResult(Base):
+    __tablename__ = 'week_results'
+
+    # Итоговый снимок недели, записывается при её финализации (см. results.py)
+    theme_week_id = Column(String(36), ForeignKey('theme_weeks.id'), primary_key=True)
+    video_id = Column(String(36), ForeignKey('videos.id'), primary_key=True)
+    votes_count = Column(Integer, nullable=False)
+    rank = Column(Integer, nullable=False)
+    is_winner = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (Index('ix_week_results_week_rank', 'theme_week_id', 'rank'),)
+
+class SearchVersion(Base):
+    __tablename__ = 'search_versions'
+
+    # Единственная строка (id = 1): номер растёт с каждой правкой видео и материалов,
+    # по нему воркеры замечают, что их поисковый индекс в памяти устарел (см. search.py)
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,106 @@
+import base64
+from datetime import datetime
+from flask import request, Response, stream_with_context
+from sqlalchemy import tuple_
+from database import get_session
+from serializers import dumps, json_response
+
+MAX_LIMIT = 1000
+STREAM_BATCH_SIZE = 500
+STREAM_FORMATS = ('json', 'ndjson')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, _, item_id = base64.urlsafe_b64decode(padded.encode()).decode().partition('|')
+        return datetime.fromisoformat(created_at), item_id
+    except ValueError as e:
+        raise InvalidCursor(str(e))
+
+
+def keyset(query, model, after=None):
+    # Keyset-пагинация по (created_at, id): стабильный порядок без OFFSET
+    query = query.order_by(model.created_at, model.id)
+    if after:
+        created_at, item_id = decode_cursor(after)
+        query = query.filter(tuple_(model.created_at, model.id) > tuple_(created_at, item_id))
+    return query
+
+
+def clamp_limit(limit):
+    return max(1, min(limit, MAX_LIMIT)) if limit is not None else None
+
+
+def fetch_page(session, build_query, model, after=None, limit=None):
+    # Строки страницы и курсор следующей (None, если страница последняя)
+    query = keyset(build_query(session), model, after)
+    if limit:
+        # Одна лишняя строка показывает, есть ли следующая страница
+        query = query.limit(limit + 1)
+    rows = query.all()
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit]
+    return rows, (encode_cursor(rows[-1]) if has_more else None)
+
+
+def _stream(build_query, model, serialize, after, limit, fmt):
+    session = get_session()
+    query = keyset(build_query(session), model, after)
+    if limit:
+        query = query.limit(limit)
+    rows = query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+
+    if fmt == 'ndjson':
+        for row in rows:
+            yield dumps(serialize(row)) + b'\n'
+        return
+
+    yield b'['
+    first = True
+    for row in rows:
+        yield (b'' if first else b',') + dumps(serialize(row))
+        first = False
+    yield b']'
+
+
+def stream_response(build_query, model, serialize, fmt='ndjson', after=None, limit=None):
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(
+        stream_with_context(_stream(build_query, model, serialize, after, limit, fmt)),
+        mimetype=mimetype
+    )
+
+
+def list_response(build_query, model, serialize):
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
+    fmt = request.args.get('stream')
+
+    limit = clamp_limit(limit)
+    if fmt and fmt not in STREAM_FORMATS:
+        return json_response({'error': f'Unsupported stream format: {fmt}'}, 400)
+
+    try:
+        if after:
+            decode_cursor(after)
+    except InvalidCursor:
+        return json_response({'error': 'Invalid cursor'}, 400)
+
+    if fmt:
+        return stream_response(build_query, model, serialize, fmt, after, limit)
+
+    rows, cursor = fetch_page(get_session(), build_query, model, after, limit)
+    response = json_response([serialize(row) for row in rows])
+    if cursor:
+        response.headers['X-Next-Cursor'] = cursor
+    return response
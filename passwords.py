@@ -0,0 +1,132 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+# Формат хэша: 'scrypt$n$r$p$соль$хэш' или 'pbkdf2_sha256$итерации$соль$хэш'.
+# Параметры хранятся в строке, поэтому смена стоимости не ломает старые хэши:
+# они проверяются по своим параметрам и пересчитываются при следующем входе.
+SALT_BYTES = 16
+KEY_BYTES = 32
+PREFIXES = ('scrypt$', 'pbkdf2_sha256$')
+
+_executor = None
+_pid = None
+_lock = threading.Lock()
+_dummy = {}
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def current_params():
+    if Config.PASSWORD_HASH_ALGORITHM == 'scrypt':
+        n = Config.PASSWORD_SCRYPT_N
+        if n < 2 or n & (n - 1):
+            raise ValueError('PASSWORD_SCRYPT_N must be a power of two')
+        return ('scrypt', n, Config.PASSWORD_SCRYPT_R, Config.PASSWORD_SCRYPT_P)
+    if Config.PASSWORD_HASH_ALGORITHM == 'pbkdf2_sha256':
+        return ('pbkdf2_sha256', Config.PASSWORD_PBKDF2_ITERATIONS)
+    raise ValueError(f'Unknown PASSWORD_HASH_ALGORITHM: {Config.PASSWORD_HASH_ALGORITHM}')
+
+
+def _derive(password, salt, params):
+    # hashlib отпускает GIL на время scrypt/PBKDF2, так что потоки пула работают параллельно
+    if params[0] == 'scrypt':
+        _, n, r, p = params
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p, dklen=KEY_BYTES)
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params[1], dklen=KEY_BYTES)
+
+
+def _parse(stored):
+    algorithm, *rest = stored.split('$')
+    if algorithm == 'scrypt' and len(rest) == 5:
+        return ('scrypt', int(rest[0]), int(rest[1]), int(rest[2])), _unb64(rest[3]), _unb64(rest[4])
+    if algorithm == 'pbkdf2_sha256' and len(rest) == 3:
+        return ('pbkdf2_sha256', int(rest[0])), _unb64(rest[1]), _unb64(rest[2])
+    raise ValueError('Malformed password hash')
+
+
+def is_hashed(value):
+    return isinstance(value, str) and value.startswith(PREFIXES)
+
+
+def _hash(password, params):
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _derive(password, salt, params)
+    return '$'.join([*map(str, params), _b64(salt), _b64(key)])
+
+
+def _verify(password, stored, params):
+    # Возвращает (пароль верен, новый хэш или None)
+    if stored is None:
+        # Неизвестный пользователь: тратим столько же времени, чтобы не выдавать, что его нет
+        if params not in _dummy:
+            _dummy[params] = _hash('', params)
+        stored = _dummy[params]
+        _verify(password, stored, params)
+        return False, None
+
+    if not is_hashed(stored):
+        # Старые строки с паролем в открытом виде: сверяем и сразу хэшируем
+        if hmac.compare_digest(password.encode(), stored.encode()):
+            return True, _hash(password, params)
+        return False, None
+
+    try:
+        stored_params, salt, key = _parse(stored)
+    except ValueError:
+        return False, None
+    if not hmac.compare_digest(_derive(password, salt, stored_params), key):
+        return False, None
+    return True, (_hash(password, params) if stored_params != params else None)
+
+
+def _pool():
+    # Ограниченный пул: одновременно считается не больше PASSWORD_HASH_WORKERS хэшей на процесс,
+    # остальные ждут в очереди. Это ограничение параллельности, а не неблокирующий вызов:
+    # синхронные функции ниже держат вызывающий поток до конца KDF. Не занимают поток только
+    # *_async-варианты (ASGI-вход). Создаётся лениво и заново после fork.
+    global _executor, _pid
+    if _executor is None or _pid != os.getpid():
+        with _lock:
+            if _executor is None or _pid != os.getpid():
+                _pid = os.getpid()
+                _executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS or os.cpu_count(),
+                                               thread_name_prefix='password-hash')
+    return _executor
+
+
+def hash_password(password):
+    return _pool().submit(_hash, password, current_params()).result()
+
+
+def hash_many(passwords):
+    params = current_params()
+    return list(_pool().map(lambda password: _hash(password, params), passwords))
+
+
+def verify_password(password, stored):
+    # stored=None — пользователь не найден. Новый хэш возвращается, если пароль верен,
+    # а сохранённый хэш открытый текст или посчитан с другими параметрами.
+    return _pool().submit(_verify, password, stored, current_params()).result()
+
+
+async def hash_password_async(password):
+    # Тот же пул, но цикл событий обслуживает другие запросы, пока считается хэш
+    return await asyncio.wrap_future(_pool().submit(_hash, password, current_params()))
+
+
+async def verify_password_async(password, stored):
+    return await asyncio.wrap_future(_pool().submit(_verify, password, stored, current_params()))
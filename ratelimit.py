@@ -0,0 +1,160 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify, g
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+_backend = None
+_limits = {}
+
+
+def parse_limit(value):
+    # '10/minute' -> (ёмкость ведра, пополнение в секунду)
+    count, _, period = value.partition('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip() or 'second']
+
+
+def _take(tokens, updated, now, capacity, rate):
+    # Возвращает (новый запас, сколько секунд ждать; 0 — запрос пропущен)
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBackend:
+    # Вёдра в памяти процесса: dict + LRU-вытеснение, O(1) на запрос
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, wait = _take(tokens, updated, now, capacity, rate)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SharedBackend:
+    # Хэш-таблица вёдер в mmap-файле, общая для всех воркеров gunicorn на машине.
+    # Слот: 8 байт отпечатка ключа, запас и время обновления (double); доступ под flock.
+
+    SLOT = struct.Struct('=8sdd')
+    PROBES = 8
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        size = self.SLOT.size * slots
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._lock_file = None
+        self._pid = None
+        self._thread_lock = threading.Lock()
+
+    def _file_lock(self):
+        # flock принадлежит открытому файлу, а он наследуется при fork: каждому процессу свой
+        if self._lock_file is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock_file = open(self.path + '.lock', 'a')
+        return self._lock_file
+
+    def hit(self, key, capacity, rate):
+        fingerprint = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        start = int.from_bytes(fingerprint, 'little') % self.slots
+        now = time.time()
+        with self._thread_lock:
+            lock_file = self._file_lock()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                offset, tokens, updated = self._find(fingerprint, start, capacity, now)
+                tokens, wait = _take(tokens, updated, now, capacity, rate)
+                self.SLOT.pack_into(self._map, offset, fingerprint, tokens, now)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return wait
+
+    def _find(self, fingerprint, start, capacity, now):
+        # Линейное пробирование; при переполнении занимаем самый давно обновлённый слот
+        oldest = None
+        for probe in range(self.PROBES):
+            offset = ((start + probe) % self.slots) * self.SLOT.size
+            stored, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+            if stored == fingerprint:
+                return offset, tokens, updated
+            if stored == b'\0' * 8:
+                return offset, capacity, now
+            if oldest is None or updated < oldest[1]:
+                oldest = (offset, updated)
+        return oldest[0], capacity, now
+
+
+def forwarded_for(header, hops, remote_addr):
+    # Адрес клиента, записанный hops-м доверенным прокси с конца X-Forwarded-For (как ProxyFix x_for)
+    addresses = [value.strip() for value in (header or '').split(',') if value.strip()]
+    return addresses[-hops] if hops and len(addresses) >= hops else remote_addr
+
+
+def init_app(app):
+    global _backend
+    _limits.clear()
+    kind = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+    if kind == 'memory':
+        _backend = MemoryBackend()
+    elif kind == 'shared':
+        _backend = SharedBackend(app.config['RATE_LIMIT_SHARED_PATH'])
+    elif kind in (None, '', 'none'):
+        _backend = None
+        return
+    else:
+        raise ValueError(f'Unknown RATE_LIMIT_BACKEND: {kind}')
+
+    for endpoint, value in app.config.get('RATE_LIMITS', {}).items():
+        if value:
+            _limits[endpoint] = parse_limit(value)
+
+
+def check(endpoint, remote_addr, user_id=None):
+    # Сколько секунд ждать клиенту; 0 — запрос пропущен (или лимита нет)
+    limit = _limits.get(endpoint)
+    if _backend is None or limit is None:
+        return 0
+
+    keys = [f'{endpoint}:ip:{remote_addr}']
+    if user_id:
+        keys.append(f'{endpoint}:user:{user_id}')
+    return max(_backend.hit(key, *limit) for key in keys)
+
+
+def rate_limited(view):
+    # Ставится под token_required, чтобы знать пользователя; срабатывает до открытия сессии БД
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        wait = check(request.endpoint, request.remote_addr, g.get('user_id'))
+        if wait:
+            response = jsonify({'error': 'Too many requests'})
+            response.headers['Retry-After'] = str(math.ceil(wait))
+            return response, 429
+        return view(*args, **kwargs)
+    return decorated
@@ -0,0 +1,91 @@
+from datetime import datetime
+from sqlalchemy import func, select
+from models import ThemeWeek, Video, Vote, Material, WeekResult
+from cache import invalidate
+
+
+class FinalizationError(ValueError):
+    pass
+
+
+def lock_week(session, week_id):
+    query = session.query(ThemeWeek).filter(ThemeWeek.id == week_id)
+    if session.get_bind().dialect.name == 'postgresql':
+        # Два одновременных запуска не запишут снимок дважды
+        query = query.with_for_update()
+    return query.first()
+
+
+def rank_totals(totals, winners):
+    # totals отсортированы по голосам; равные голоса делят место (1, 2, 2, 4)
+    rows = []
+    rank = 0
+    previous = None
+    for position, (video_id, votes_count) in enumerate(totals, start=1):
+        if votes_count != previous:
+            rank, previous = position, votes_count
+        rows.append({
+            'video_id': video_id,
+            'votes_count': votes_count,
+            'rank': rank,
+            'is_winner': rank <= winners and votes_count > 0
+        })
+    return rows
+
+
+def finalize_week(session, week, winners, force=False, now=None):
+    # Всё в транзакции вызывающего: итоги по таблице votes, снимок, победители, заморозка
+    now = now or datetime.utcnow()
+    if week.finalized_at is not None:
+        raise FinalizationError('Theme week is already finalized')
+    if week.end_date > now and not force:
+        raise FinalizationError('Theme week has not ended yet')
+
+    votes_count = func.count(Vote.id)
+    totals = session.query(Video.id, votes_count) \
+        .outerjoin(Vote, Vote.video_id == Video.id) \
+        .filter(Video.theme_week_id == week.id) \
+        .group_by(Video.id) \
+        .order_by(votes_count.desc(), Video.id) \
+        .all()
+    rows = rank_totals(totals, winners)
+
+    session.query(WeekResult).filter(WeekResult.theme_week_id == week.id).delete(synchronize_session=False)
+    if rows:
+        session.execute(WeekResult.__table__.insert(), [dict(row, theme_week_id=week.id) for row in rows])
+
+    # Материалы победителей — те, что ссылаются на то же видео
+    winner_ids = [row['video_id'] for row in rows if row['is_winner']]
+    if winner_ids:
+        winner_urls = select(Video.youtube_url).where(Video.id.in_(winner_ids))
+        session.query(Material) \
+            .filter(Material.theme_week_id == week.id, Material.url.in_(winner_urls)) \
+            .update({Material.is_winner: True}, synchronize_session=False)
+
+    week.finalized_at = now
+    return rows
+
+
+def delete_results(session, week_id=None, video_id=None):
+    query = session.query(WeekResult)
+    if week_id is not None:
+        query = query.filter(WeekResult.theme_week_id == week_id)
+    if video_id is not None:
+        query = query.filter(WeekResult.video_id == video_id)
+    query.delete(synchronize_session=False)
+
+
+def due_weeks(session, now=None):
+    now = now or datetime.utcnow()
+    return [week_id for week_id, in session.query(ThemeWeek.id)
+            .filter(ThemeWeek.end_date <= now, ThemeWeek.finalized_at.is_(None))
+            .order_by(ThemeWeek.end_date)]
+
+
+def invalidate_results(week_id):
+    # Итоги меняют рейтинг, материалы (is_winner) и finalized_at в карточках недели
+    for endpoint in ('theme_weeks.get_theme_weeks', 'theme_weeks.get_current_theme_week',
+                     'theme_weeks.get_all_materials'):
+        invalidate(endpoint)
+    invalidate('theme_weeks.get_theme_week', week_id=week_id)
+    invalidate('theme_weeks.get_leaderboard', week_id=week_id)
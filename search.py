@@ -0,0 +1,247 @@
+import bisect
+import re
+import threading
+from sqlalchemy import func, literal_column, select, update
+from database import get_engine
+from models import Video, Material, SearchVersion
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Документ для поиска; это же выражение лежит в GIN-индексах Postgres (миграция 4),
+# поэтому текст должен совпадать с индексом буква в букву
+SEARCH_DOCUMENT_SQL = "coalesce(title, '') || ' ' || coalesce(student_name, '') || ' ' || coalesce(description, '')"
+SEARCH_VECTOR_SQL = f"to_tsvector('simple', {SEARCH_DOCUMENT_SQL})"
+
+KINDS = {
+    'video': (Video, Video.youtube_url),
+    'material': (Material, Material.url)
+}
+
+FIELD_WEIGHTS = {'title': 3.0, 'student_name': 2.0, 'description': 1.0}
+
+
+def tokenize(text):
+    return TOKEN.findall((text or '').lower())
+
+
+def _document(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'student_name': row.student_name,
+        'theme_week_id': row.theme_week_id,
+        'url': row.url
+    }
+
+
+def _columns(model, url_column):
+    return (model.id, model.title, model.description, model.student_name, model.theme_week_id,
+            url_column.label('url'))
+
+
+class InvertedIndex:
+    # Инвертированный индекс в памяти процесса для SQLite и локальной разработки. У каждого
+    # воркера свой; version — номер из search_versions, с которым индекс согласован: правки
+    # из другого процесса меняют номер, и индекс перестраивается при следующем поиске.
+    # Термины хранятся отсортированными, поиск по префиксу — через bisect.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._documents = {}
+        self._document_terms = {}
+        self._terms = []
+        self._terms_dirty = False
+        self.version = None
+
+    def add(self, kind, document):
+        key = (kind, document['id'])
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(document.get(field)):
+                weights[term] = weights.get(term, 0.0) + weight
+
+        with self._lock:
+            self._remove(key)
+            for term, weight in weights.items():
+                postings = self._postings.setdefault(term, {})
+                if not postings:
+                    self._terms_dirty = True
+                postings[key] = weight
+            self._documents[key] = document
+            self._document_terms[key] = set(weights)
+
+    def remove(self, kind, document_id):
+        with self._lock:
+            self._remove((kind, document_id))
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._document_terms.clear()
+            self._terms = []
+            self._terms_dirty = False
+            self.version = None
+
+    def advance(self, version):
+        # Своя правка уже внесена в индекс: если других между ними не было, перестраивать незачем
+        with self._lock:
+            if self.version is not None and self.version == version - 1:
+                self.version = version
+
+    def _remove(self, key):
+        for term in self._document_terms.pop(key, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+                    self._terms_dirty = True
+        self._documents.pop(key, None)
+
+    def _matching_terms(self, prefix):
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + '\U0010ffff')
+        return self._terms[start:end]
+
+    def search(self, query, theme_week_id=None, kind=None, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for prefix in terms:
+                term_scores = {}
+                for term in self._matching_terms(prefix):
+                    # Точное совпадение весит больше, чем совпадение по префиксу
+                    boost = 1.0 if term == prefix else 0.5
+                    for key, weight in self._postings[term].items():
+                        term_scores[key] = term_scores.get(key, 0.0) + weight * boost
+                scores = term_scores if scores is None else {
+                    key: score + term_scores[key] for key, score in scores.items() if key in term_scores
+                }
+                if not scores:
+                    return []
+
+            results = []
+            for key, score in scores.items():
+                document = self._documents[key]
+                if kind and key[0] != kind:
+                    continue
+                if theme_week_id and document['theme_week_id'] != theme_week_id:
+                    continue
+                results.append(dict(document, type=key[0], rank=round(score, 6)))
+
+        results.sort(key=lambda item: (-item['rank'], item['id']))
+        return results[:limit]
+
+
+_index = InvertedIndex()
+_load_lock = threading.Lock()
+
+
+def _uses_postgres():
+    return get_engine().dialect.name == 'postgresql'
+
+
+def _stored_version(session):
+    return session.query(SearchVersion.version).filter(SearchVersion.id == 1).scalar()
+
+
+def _ensure_current(session):
+    global _index
+    version = _stored_version(session)
+    if _index.version is not None and _index.version == version:
+        return
+    with _load_lock:
+        if _index.version is not None and _index.version == version:
+            return
+        # Номер читается до строк в той же транзакции: правка, закоммиченная позже, поднимет его снова.
+        # Новый индекс строится рядом, пока поиск идёт по старому
+        index = InvertedIndex()
+        version = _stored_version(session)
+        for kind, (model, url_column) in KINDS.items():
+            for row in session.query(*_columns(model, url_column)).yield_per(1000):
+                index.add(kind, _document(row))
+        index.version = version
+        _index = index
+
+
+def _bump_version(index=None):
+    # Отдельная короткая транзакция после коммита правки: другие воркеры увидят новый номер
+    table = SearchVersion.__table__
+    with get_engine().begin() as connection:
+        connection.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1))
+        version = connection.execute(select(table.c.version).where(table.c.id == 1)).scalar()
+    if index is not None:
+        index.advance(version)
+
+
+def _search_postgres(session, query, theme_week_id, kind, limit):
+    terms = tokenize(query)
+    if not terms:
+        return []
+    tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+    vector = literal_column(SEARCH_VECTOR_SQL)
+    rank = func.ts_rank(vector, tsquery).label('rank')
+
+    results = []
+    for name, (model, url_column) in KINDS.items():
+        if kind and kind != name:
+            continue
+        rows = session.query(*_columns(model, url_column), rank).filter(vector.op('@@')(tsquery))
+        if theme_week_id:
+            rows = rows.filter(model.theme_week_id == theme_week_id)
+        results.extend(dict(_document(row), type=name, rank=round(row.rank, 6))
+                       for row in rows.order_by(rank.desc()).limit(limit))
+
+    results.sort(key=lambda item: (-item['rank'], item['id']))
+    return results[:limit]
+
+
+def search(session, query, theme_week_id=None, kind=None, limit=20):
+    if _uses_postgres():
+        return _search_postgres(session, query, theme_week_id, kind, limit)
+    _ensure_current(session)
+    return _index.search(query, theme_week_id, kind, limit)
+
+
+def index_document(kind, obj):
+    # В Postgres индекс выражений обновляется самой базой
+    if _uses_postgres():
+        return
+    index = _index
+    # Ещё не загруженный индекс всё равно прочитает правку из базы при первом поиске
+    if index.version is not None:
+        url_column = KINDS[kind][1]
+        index.add(kind, {
+            'id': obj.id,
+            'title': obj.title,
+            'description': obj.description,
+            'student_name': obj.student_name,
+            'theme_week_id': obj.theme_week_id,
+            'url': getattr(obj, url_column.key)
+        })
+    _bump_version(index)
+
+
+def remove_document(kind, document_id):
+    if _uses_postgres():
+        return
+    index = _index
+    index.remove(kind, document_id)
+    _bump_version(index)
+
+
+def reset():
+    # После массовых изменений индекс перестраивается при следующем поиске — и в этом воркере, и в остальных
+    if _uses_postgres():
+        return
+    _index.clear()
+    _bump_version()
@@ -0,0 +1,5 @@
+from serializers.base import Serializer, Field, InvalidFields, dumps, json_response, init_app
+from serializers.users import user_serializer, user_export_serializer
+from serializers.videos import video_serializer, VIDEO_LIST_FIELDS
+from serializers.materials import material_serializer
+from serializers.theme_weeks import theme_week_serializer, THEME_WEEK_LIST_FIELDS
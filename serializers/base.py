@@ -0,0 +1,100 @@
+import json
+from flask import request, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+if orjson is not None:
+    def dumps(data):
+        return orjson.dumps(data)
+else:
+    def dumps(data):
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def json_response(data, status=200, headers=None):
+    return Response(dumps(data), status=status, headers=headers, mimetype='application/json')
+
+
+def iso(value):
+    return value.isoformat()
+
+
+class Field:
+    # column — колонка или SQL-выражение; format применяется к не-None значениям;
+    # join добавляет в запрос соединение, нужное только этому полю
+    __slots__ = ('column', 'format', 'join')
+
+    def __init__(self, column, format=None, join=None):
+        self.column = column
+        self.format = format
+        self.join = join
+
+
+class Serializer:
+    def __init__(self, model, fields, default=None):
+        self.model = model
+        self.fields = fields
+        self.default = tuple(default or fields)
+        self._dumpers = {}
+
+    def extend(self, **fields):
+        return Serializer(self.model, dict(self.fields, **fields), self.default + tuple(fields))
+
+    def parse(self, default=None):
+        # ?fields=id,title — разреженный набор полей; без параметра отдаётся default
+        return self.names(request.args.get('fields'), default)
+
+    def names(self, value, default=None):
+        if not value:
+            return default or self.default
+        names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+        return names or default or self.default
+
+    def query(self, session, names):
+        # Только нужные колонки вместо ORM-сущностей; id и created_at добираются в конец,
+        # на них держатся keyset-пагинация и курсор
+        columns = [self.fields[name].column.label(name) for name in names]
+        columns += [getattr(self.model, key).label(key) for key in ('id', 'created_at') if key not in names]
+        query = session.query(*columns).select_from(self.model)
+        joins = []
+        for name in names:
+            join = self.fields[name].join
+            if join is not None and join not in joins:
+                joins.append(join)
+                query = join(query)
+        return query
+
+    def get(self, session, item_id, names):
+        row = self.query(session, names).filter(self.model.id == item_id).first()
+        return self.dumper(names)(row) if row is not None else None
+
+    def dumper(self, names):
+        dump = self._dumpers.get(names)
+        if dump is None:
+            fields = [(name, self.fields[name].format) for name in names]
+
+            def dump(row):
+                item = {}
+                for (name, format), value in zip(fields, row):
+                    item[name] = value if format is None or value is None else format(value)
+                return item
+
+            self._dumpers[names] = dump
+        return dump
+
+
+def init_app(app):
+    @app.errorhandler(InvalidFields)
+    def invalid_fields(e):
+        return json_response({'error': str(e)}, 400)
@@ -0,0 +1,14 @@
+from models import Material
+from serializers.base import Serializer, Field, iso
+
+material_serializer = Serializer(Material, {
+    'id': Field(Material.id),
+    'title': Field(Material.title),
+    'description': Field(Material.description),
+    'student_name': Field(Material.student_name),
+    'material_type': Field(Material.material_type),
+    'url': Field(Material.url),
+    'is_winner': Field(Material.is_winner),
+    'theme_week_id': Field(Material.theme_week_id),
+    'created_at': Field(Material.created_at, iso)
+})
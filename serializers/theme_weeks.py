@@ -0,0 +1,28 @@
+from sqlalchemy import func, select
+from models import ThemeWeek, Video
+from serializers.base import Serializer, Field, iso
+
+# Количество видео считается одним сгруппированным подзапросом
+_videos_count = select(Video.theme_week_id, func.count(Video.id).label('videos_count')) \
+    .group_by(Video.theme_week_id) \
+    .subquery()
+
+
+def _join_videos_count(query):
+    return query.outerjoin(_videos_count, _videos_count.c.theme_week_id == ThemeWeek.id)
+
+
+theme_week_serializer = Serializer(ThemeWeek, {
+    'id': Field(ThemeWeek.id),
+    'title': Field(ThemeWeek.title),
+    'description': Field(ThemeWeek.description),
+    'start_date': Field(ThemeWeek.start_date, iso),
+    'end_date': Field(ThemeWeek.end_date, iso),
+    'videos_count': Field(func.coalesce(_videos_count.c.videos_count, 0), join=_join_videos_count),
+    'result_url': Field(ThemeWeek.result_url),
+    'image_url': Field(ThemeWeek.image_url),
+    'finalized_at': Field(ThemeWeek.finalized_at, iso)
+}, default=('id', 'title', 'description', 'start_date', 'end_date', 'result_url', 'image_url', 'finalized_at'))
+
+THEME_WEEK_LIST_FIELDS = ('id', 'title', 'description', 'start_date', 'end_date', 'videos_count',
+                          'result_url', 'image_url', 'finalized_at')
@@ -0,0 +1,12 @@
+from models import User
+from serializers.base import Serializer, Field, iso
+
+user_serializer = Serializer(User, {
+    'id': Field(User.id),
+    'username': Field(User.username),
+    'is_admin': Field(User.is_admin),
+    'created_at': Field(User.created_at, iso)
+})
+
+# Только для выгрузки администратором
+user_export_serializer = user_serializer.extend(password_hash=Field(User.password_hash))
@@ -0,0 +1,23 @@
+from sqlalchemy import func
+from models import Video, VoteTally
+from serializers.base import Serializer, Field, iso
+
+
+def _join_tally(query):
+    return query.outerjoin(VoteTally, VoteTally.video_id == Video.id)
+
+
+video_serializer = Serializer(Video, {
+    'id': Field(Video.id),
+    'title': Field(Video.title),
+    'youtube_url': Field(Video.youtube_url),
+    'description': Field(Video.description),
+    'student_name': Field(Video.student_name),
+    'theme_week_id': Field(Video.theme_week_id),
+    'votes_count': Field(func.coalesce(VoteTally.votes_count, 0), join=_join_tally),
+    'created_at': Field(Video.created_at, iso)
+}, default=('id', 'title', 'youtube_url', 'description', 'student_name', 'theme_week_id', 'created_at'))
+
+# Публичный список показывает голоса
+VIDEO_LIST_FIELDS = ('id', 'title', 'youtube_url', 'description', 'student_name', 'theme_week_id',
+                     'votes_count', 'created_at')
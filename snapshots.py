@@ -0,0 +1,124 @@
+import os
+import re
+import tempfile
+from functools import wraps
+from flask import request, send_file
+from models import ThemeWeek
+from serializers import dumps, theme_week_serializer
+import compression
+
+# Подведённая неделя (finalized_at) больше не меняется: голосование закрыто. Её карточка
+# (неделя, видео, материалы) пишется в JSON-файл и отдаётся с диска через sendfile, без базы.
+# Правка такой недели в админке перезаписывает файл, снятие итогов или удаление — убирает его.
+SAFE_ID = re.compile(r'^[\w-]+$')
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+_settings = {'enabled': False, 'directory': None, 'max_age': 86400}
+
+
+def init_app(app):
+    _settings['enabled'] = app.config.get('SNAPSHOTS_ENABLED', True)
+    _settings['directory'] = app.config['SNAPSHOT_DIR']
+    _settings['max_age'] = app.config.get('SNAPSHOT_MAX_AGE', 86400)
+    if _settings['enabled']:
+        os.makedirs(_settings['directory'], exist_ok=True)
+
+
+def snapshot_path(week_id):
+    if not _settings['enabled'] or not SAFE_ID.match(week_id):
+        return None
+    return os.path.join(_settings['directory'], f'{week_id}.json')
+
+
+def _write(path, data):
+    # Запись во временный файл и rename: читатели видят либо старую версию, либо новую
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def write_snapshot(session, week_id):
+    # Импорт здесь: blueprints.theme_weeks сам использует этот модуль
+    from blueprints.theme_weeks import week_detail
+    path = snapshot_path(week_id)
+    week = week_detail(session, week_id, theme_week_serializer.default) if path else None
+    if week is None:
+        return None
+
+    body = dumps(week)
+    encoded = compression.encode_all(body, 'application/json')
+    # Сначала варианты, потом основной файл: по нему решается, есть ли снимок
+    for encoding, suffix in SUFFIXES.items():
+        if encoding in encoded:
+            _write(path + suffix, encoded[encoding])
+        else:
+            _unlink(path + suffix)
+    _write(path, body)
+    return path
+
+
+def remove_snapshot(week_id):
+    path = snapshot_path(week_id)
+    if path:
+        _unlink(path)
+        for suffix in SUFFIXES.values():
+            _unlink(path + suffix)
+
+
+def refresh(session, *week_ids):
+    # После правок админки: у подведённых недель снимок пересобирается, у остальных удаляется
+    if not _settings['enabled']:
+        return
+    week_ids = set(filter(None, week_ids))
+    finalized = {week_id for (week_id,) in session.query(ThemeWeek.id)
+                 .filter(ThemeWeek.id.in_(week_ids), ThemeWeek.finalized_at.isnot(None))} if week_ids else set()
+    for week_id in week_ids:
+        if week_id in finalized:
+            write_snapshot(session, week_id)
+        else:
+            remove_snapshot(week_id)
+
+
+def archived_weeks(session):
+    return [week_id for (week_id,) in session.query(ThemeWeek.id).filter(ThemeWeek.finalized_at.isnot(None))]
+
+
+def _send(path):
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    suffix = SUFFIXES.get(encoding)
+    if suffix and os.path.exists(path + suffix):
+        response = send_file(path + suffix, mimetype='application/json', max_age=_settings['max_age'])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_file(path, mimetype='application/json', max_age=_settings['max_age'])
+    response.vary.add('Accept-Encoding')
+    response.headers['X-Snapshot'] = 'HIT'
+    return response
+
+
+def served(view):
+    # Ставится над cached: снимок отдаётся раньше кэша и базы; ?fields= и прочие параметры — мимо снимка
+    @wraps(view)
+    def decorated(week_id, **kwargs):
+        path = snapshot_path(week_id) if not request.args else None
+        if path and os.path.exists(path):
+            try:
+                return _send(path)
+            except FileNotFoundError:
+                # Снимок удалили между проверкой и открытием
+                pass
+        return view(week_id, **kwargs)
+    return decorated
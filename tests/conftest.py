@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+# Config читает DATABASE_URL при импорте, поэтому временная база задаётся до импорта модулей приложения
+_db_dir = tempfile.mkdtemp(prefix='restart-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'none')
+os.environ.setdefault('SNAPSHOTS_ENABLED', 'false')
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'none')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from sqlalchemy import event
+import migrations
+from app import create_app
+from database import get_engine
+
+
+@pytest.fixture(scope='module')
+def client():
+    migrations.upgrade(echo=lambda *args: None)
+    return create_app().test_client()
+
+
+@pytest.fixture
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = get_engine()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
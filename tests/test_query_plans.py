@@ -0,0 +1,33 @@
+import pytest
+from database import SessionLocal, get_engine
+from models import ThemeWeek, Video, Material, Vote, User, VoteTally, WeekResult
+from benchmarks.query_plans import auth_headers, endpoints, explain_endpoint
+from benchmarks.seed import seed
+
+
+@pytest.fixture(scope='module')
+def data(client):
+    # Те же объёмы, что у python -m benchmarks.query_plans: на пустых таблицах планировщику всё равно
+    session = SessionLocal()
+    try:
+        for model in (WeekResult, VoteTally, Vote, Video, Material, ThemeWeek, User):
+            session.query(model).delete()
+        session.commit()
+    finally:
+        session.close()
+    return seed(get_engine(), users=2000, weeks=20, videos=2000, materials=2000, votes=20000)
+
+
+def test_queries_use_indexes(client, data):
+    engine = get_engine()
+    checks = endpoints(data, auth_headers(data, 0, True), auth_headers(data, 1, False), engine.dialect.name)
+    failures = []
+    for method, path, headers, body in checks:
+        response, queries, plans = explain_endpoint(client, engine, method, path, headers, body)
+        assert response.status_code < 500, f'{method} {path}: HTTP {response.status_code}'
+        assert queries, f'{method} {path}: no queries captured'
+        for statement, scans, plan in plans:
+            if scans:
+                failures.append(f'{method} {path}: sequential scan on {", ".join(sorted(set(scans)))}\n'
+                                f'  {" ".join(statement.split())}\n' + '\n'.join(f'    {line}' for line in plan))
+    assert not failures, '\n'.join(failures)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+import pytest
+from database import SessionLocal
+from models import ThemeWeek, Video, Material, Vote, User, VoteTally, WeekResult
+
+VIDEOS_PER_WEEK = 3
+MATERIALS_PER_WEEK = 2
+
+
+def set_weeks(total):
+    # Недели с видео, материалами и голосами: у каждой есть что посчитать
+    session = SessionLocal()
+    try:
+        for model in (WeekResult, VoteTally, Vote, Video, Material, ThemeWeek, User):
+            session.query(model).delete()
+        user = User(username='voter', password_hash='x')
+        session.add(user)
+        start = datetime(2026, 1, 5)
+        for index in range(total):
+            week = ThemeWeek(title=f'Week {index}', result_url='https://example.com/result',
+                             image_url='https://example.com/image.png',
+                             start_date=start + timedelta(weeks=index), end_date=start + timedelta(weeks=index + 1))
+            session.add(week)
+            session.flush()
+            for number in range(VIDEOS_PER_WEEK):
+                video = Video(title=f'Video {number}', youtube_url='https://youtu.be/x', student_name='Student',
+                              theme_week_id=week.id)
+                session.add(video)
+                session.flush()
+                session.add(Vote(user_id=user.id, video_id=video.id))
+            for number in range(MATERIALS_PER_WEEK):
+                session.add(Material(title=f'Material {number}', student_name='Student', material_type='pdf',
+                                     url='https://example.com/file.pdf', theme_week_id=week.id))
+        session.commit()
+        return [week_id for (week_id,) in session.query(ThemeWeek.id)]
+    finally:
+        session.close()
+
+
+def test_list_query_count_does_not_grow(client, count_queries):
+    # Одна выборка с videos_count при N и 10×N неделях: счётчики не догружаются по неделе
+    counts = []
+    for total in (5, 50):
+        set_weeks(total)
+        count_queries.clear()
+        response = client.get('/api/theme-weeks/')
+        assert response.status_code == 200
+        weeks = response.get_json()
+        assert len(weeks) == total
+        assert all(week['videos_count'] == VIDEOS_PER_WEEK for week in weeks)
+        counts.append(len(count_queries))
+    assert counts == [1, 1]
+
+
+@pytest.mark.parametrize('total', [5, 50])
+def test_detail_query_count_is_fixed(client, count_queries, total):
+    week_id = set_weeks(total)[0]
+    count_queries.clear()
+    response = client.get(f'/api/theme-weeks/{week_id}')
+    assert response.status_code == 200
+    week = response.get_json()
+    assert len(week['videos']) == VIDEOS_PER_WEEK
+    assert len(week['materials']) == MATERIALS_PER_WEEK
+    # Неделя, её видео и её материалы
+    assert len(count_queries) == 3
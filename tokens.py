@@ -0,0 +1,119 @@
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+import jwt
+from flask import request, jsonify, g
+from config import Config
+
+
+class TokenCache:
+    # LRU проверенных payload'ов, ключ — SHA-256 токена; учитывает exp
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is None:
+                return None
+            if 'exp' in payload and payload['exp'] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return payload
+
+    def set(self, digest, payload):
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = TokenCache(Config.TOKEN_CACHE_SIZE)
+
+
+def issue_token(user):
+    return jwt.encode(
+        {
+            'user_id': user.id,
+            'username': user.username,
+            'is_admin': user.is_admin,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
+        },
+        Config.SECRET_KEY,
+        algorithm="HS256"
+    )
+
+
+def decode_token(token, use_cache=True):
+    if not use_cache:
+        return jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
+
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = _cache.get(digest)
+    if payload is None:
+        # Просроченный или неверный токен бросает исключение и в кэш не попадает
+        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
+        _cache.set(digest, payload)
+    return payload
+
+
+def check_authorization(token):
+    # Значение заголовка Authorization -> (payload, None) или (None, текст ошибки)
+    if not token:
+        return None, 'Token is missing'
+
+    # Remove 'Bearer ' prefix if present
+    if token.startswith('Bearer '):
+        token = token[7:]
+
+    try:
+        return decode_token(token), None
+    except jwt.ExpiredSignatureError:
+        return None, 'Token has expired'
+    except jwt.InvalidTokenError:
+        return None, 'Invalid token'
+
+
+def _authenticate():
+    data, error = check_authorization(request.headers.get('Authorization'))
+    if error:
+        return jsonify({'error': error}), 401
+
+    g.user = data
+    g.user_id = data['user_id']
+    g.is_admin = data.get('is_admin', False)
+    return None
+
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        error = _authenticate()
+        if error:
+            return error
+        return f(*args, **kwargs)
+    return decorated
+
+
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        error = _authenticate()
+        if error:
+            return error
+        if not g.is_admin:
+            return jsonify({'error': 'Требуется доступ администратора'}), 403
+        return f(*args, **kwargs)
+    return decorated
@@ -0,0 +1,336 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from uuid import uuid4
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from models import Video, Vote, VoteTally
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_buffer = None
+_voted = None
+
+
+class VoteTimeout(Exception):
+    # Буфер не успел записать голос; он может быть записан позже
+    pass
+
+
+def dialect_insert(session, table):
+    # INSERT с поддержкой ON CONFLICT для диалектов, где он есть
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def increment_tally(session, video_id, theme_week_id, amount=1):
+    stmt = dialect_insert(session, VoteTally.__table__)
+    if stmt is not None:
+        stmt = stmt.values(video_id=video_id, theme_week_id=theme_week_id, votes_count=amount)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[VoteTally.video_id],
+            set_={'votes_count': VoteTally.votes_count + amount}
+        )
+        session.execute(stmt)
+        return
+
+    updated = session.query(VoteTally).filter(VoteTally.video_id == video_id).update(
+        {VoteTally.votes_count: VoteTally.votes_count + amount},
+        synchronize_session=False
+    )
+    if not updated:
+        session.add(VoteTally(video_id=video_id, theme_week_id=theme_week_id, votes_count=amount))
+
+
+def insert_vote(session, user_id, video_id):
+    # Один INSERT ... ON CONFLICT DO NOTHING; True, если голос новый
+    stmt = dialect_insert(session, Vote.__table__)
+    if stmt is not None:
+        stmt = stmt.values(id=str(uuid4()), user_id=user_id, video_id=video_id) \
+            .on_conflict_do_nothing(index_elements=[Vote.user_id, Vote.video_id])
+        return session.execute(stmt).rowcount == 1
+
+    savepoint = session.begin_nested()
+    try:
+        session.add(Vote(user_id=user_id, video_id=video_id))
+        session.flush()
+        savepoint.commit()
+        return True
+    except IntegrityError:
+        savepoint.rollback()
+        return False
+
+
+def record_vote(session, user_id, video_id, theme_week_id):
+    created = insert_vote(session, user_id, video_id)
+    if created:
+        increment_tally(session, video_id, theme_week_id)
+    return created
+
+
+class VoteBuffer:
+    # Накапливает голоса из разных запросов и пишет их многострочными INSERT,
+    # раз в flush_interval секунд или по достижении max_rows
+
+    def __init__(self, session_factory=SessionLocal, max_rows=200, flush_interval=0.005):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, user_id, video_id, theme_week_id):
+        future = Future()
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append((user_id, video_id, theme_week_id, future))
+            self._cond.notify()
+        return future
+
+    def _ensure_thread(self):
+        # Поток создаётся лениво и заново после fork (воркеры gunicorn) или если он упал
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = []
+            self._thread = None
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='vote-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending[:self.max_rows], self._pending[self.max_rows:]
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # Поток не должен падать: иначе все следующие голоса ждали бы до таймаута
+                logger.exception('Vote buffer flush failed')
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, batch):
+        keys = set()
+        rows = []
+        for user_id, video_id, theme_week_id, _ in batch:
+            # Повторный клик в той же пачке — не новый голос
+            if (user_id, video_id) not in keys:
+                keys.add((user_id, video_id))
+                rows.append((user_id, video_id, theme_week_id))
+
+        session = self.session_factory()
+        try:
+            try:
+                outcomes = self._write_batch(session, rows)
+            except SQLAlchemyError:
+                session.rollback()
+                # Пачка не прошла целиком (например, видео удалили до сброса):
+                # пишем построчно, чтобы ошибка досталась только своему голосу
+                outcomes = self._write_each(session, rows)
+        finally:
+            session.close()
+
+        seen = set()
+        for user_id, video_id, _, future in batch:
+            key = (user_id, video_id)
+            outcome = outcomes[key]
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome and key not in seen)
+            seen.add(key)
+
+    def _write_batch(self, session, rows):
+        created = self._insert(session, rows)
+        tallies = Counter((video_id, theme_week_id) for user_id, video_id, theme_week_id in rows
+                          if (user_id, video_id) in created)
+        for (video_id, theme_week_id), amount in tallies.items():
+            increment_tally(session, video_id, theme_week_id, amount)
+        session.commit()
+        return {(user_id, video_id): (user_id, video_id) in created for user_id, video_id, _ in rows}
+
+    def _write_each(self, session, rows):
+        # Голос — True/False, как у record_vote, или исключение этой строки
+        outcomes = {}
+        for user_id, video_id, theme_week_id in rows:
+            try:
+                outcomes[(user_id, video_id)] = record_vote(session, user_id, video_id, theme_week_id)
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                outcomes[(user_id, video_id)] = e
+        return outcomes
+
+    def _insert(self, session, rows):
+        if session.get_bind().dialect.name == 'postgresql':
+            stmt = dialect_insert(session, Vote.__table__).values([
+                {'id': str(uuid4()), 'user_id': user_id, 'video_id': video_id}
+                for user_id, video_id, _ in rows
+            ]).on_conflict_do_nothing(index_elements=[Vote.user_id, Vote.video_id]) \
+                .returning(Vote.user_id, Vote.video_id)
+            return {tuple(row) for row in session.execute(stmt)}
+
+        # Без RETURNING: построчно, но в одной транзакции
+        return {(user_id, video_id) for user_id, video_id, _ in rows
+                if insert_vote(session, user_id, video_id)}
+
+
+class VotedCache:
+    # Голоса пользователя в памяти процесса: user_id -> {video_id: theme_week_id}, LRU с TTL.
+    # Голоса из других воркеров появляются здесь не позже, чем через ttl секунд.
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, user_id):
+        item = self._entries.get(user_id)
+        if item is None:
+            return None
+        expires, votes = item
+        if expires < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return votes
+
+    def get(self, user_id):
+        # Копия: add() меняет сохранённый dict под блокировкой, пока вызывающий по нему итерирует
+        with self._lock:
+            votes = self._get(user_id)
+            return dict(votes) if votes is not None else None
+
+    def contains(self, user_id, video_id):
+        # True/False по загруженному множеству или None, если его нет
+        with self._lock:
+            votes = self._get(user_id)
+            return video_id in votes if votes is not None else None
+
+    def set(self, user_id, votes):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, dict(votes))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, user_id, video_id, theme_week_id):
+        # Только в уже загруженное множество: частичное множество нельзя считать полным
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item is not None:
+                item[1][video_id] = theme_week_id
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def init_app(app):
+    global _buffer, _voted
+    _voted = VotedCache(
+        max_entries=app.config.get('VOTED_CACHE_SIZE', 10000),
+        ttl=app.config.get('VOTED_CACHE_TTL', 30)
+    )
+    if app.config.get('VOTE_BUFFER_ENABLED'):
+        _buffer = VoteBuffer(
+            max_rows=app.config.get('VOTE_BUFFER_MAX_ROWS', 200),
+            flush_interval=app.config.get('VOTE_BUFFER_FLUSH_MS', 5) / 1000
+        )
+    else:
+        _buffer = None
+
+
+def submit_vote(session, user_id, video_id, theme_week_id, timeout=5):
+    if _buffer is None:
+        created = record_vote(session, user_id, video_id, theme_week_id)
+        session.commit()
+        return created
+    # Соединение запроса возвращается в пул до ожидания: потоку буфера нужно своё
+    # из того же пула, и при занятом пуле они ждали бы друг друга
+    session.close()
+    try:
+        return _buffer.submit(user_id, video_id, theme_week_id).result(timeout=timeout)
+    except FutureTimeout:
+        raise VoteTimeout('Vote was not written in time')
+
+
+def user_votes(session, user_id):
+    # Все голоса пользователя одним запросом по индексу unique_vote (user_id, video_id)
+    votes = _voted.get(user_id)
+    if votes is None:
+        votes = dict(session.query(Vote.video_id, Video.theme_week_id)
+                     .join(Video, Video.id == Vote.video_id)
+                     .filter(Vote.user_id == user_id))
+        _voted.set(user_id, votes)
+    return votes
+
+
+def has_voted(user_id, video_id):
+    # True — голос точно есть; None — неизвестно, решит база
+    return True if _voted is not None and _voted.contains(user_id, video_id) else None
+
+
+def remember_vote(user_id, video_id, theme_week_id):
+    if _voted is not None:
+        _voted.add(user_id, video_id, theme_week_id)
+
+
+def forget_votes():
+    # После переноса или удаления видео сохранённые недели могут быть неверны
+    if _voted is not None:
+        _voted.clear()
+
+
+def move_tally(session, video_id, theme_week_id):
+    session.query(VoteTally).filter(VoteTally.video_id == video_id).update(
+        {VoteTally.theme_week_id: theme_week_id},
+        synchronize_session=False
+    )
+
+
+def move_tallies(session, video_ids, theme_week_id):
+    session.query(VoteTally).filter(VoteTally.video_id.in_(video_ids)).update(
+        {VoteTally.theme_week_id: theme_week_id},
+        synchronize_session=False
+    )
+
+
+def delete_tally(session, video_id):
+    session.query(VoteTally).filter(VoteTally.video_id == video_id).delete(synchronize_session=False)
+
+
+def rebuild_tallies(session):
+    # Полный пересчёт агрегата по таблице votes (для существующих баз)
+    session.query(VoteTally).delete(synchronize_session=False)
+    rows = session.query(Vote.video_id, Video.theme_week_id, func.count(Vote.id)) \
+        .join(Video, Video.id == Vote.video_id) \
+        .group_by(Vote.video_id, Video.theme_week_id) \
+        .all()
+    session.bulk_insert_mappings(VoteTally, [
+        {'video_id': video_id, 'theme_week_id': theme_week_id, 'votes_count': count}
+        for video_id, theme_week_id, count in rows
+    ])
+    return len(rows)